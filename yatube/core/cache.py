@@ -0,0 +1,522 @@
+"""Кеш в локальном файле SQLite, общий для всех процессов хоста.
+
+У LocMemCache у каждого воркера gunicorn свой холодный кеш, и версия
+ленты (posts.feed_cache), повышенная в одном воркере, не видна в
+других. SQLiteCache хранит записи в одном файле в режиме WAL: читатели
+не ждут писателей, чтение идёт через mmap.
+
+* Целые числа хранятся как INTEGER, поэтому incr() — один атомарный
+  UPDATE ... RETURNING без гонки чтения и записи.
+* Размер и число записей ведут триггеры в cache_stats. Когда после
+  записи превышен OPTIONS['MAX_SIZE'] (байты) или MAX_ENTRIES,
+  удаляются просроченные записи, затем давно не читавшиеся (LRU).
+* Время чтения обновляется не чаще раза в ACCESS_RESOLUTION секунд,
+  чтобы чтение почти никогда не требовало блокировки на запись.
+
+Соединение открывается лениво и заново после fork.
+
+TieredCache ставит перед общим кешем LRU внутри процесса: горячие
+ключи (версии лент, первая страница index) читаются без запроса к
+SQLite, а записи других процессов доходят до него через журнал
+поколений в общем кеше. Блокировки и другие короткоживущие ключи
+идут мимо LRU и журнала: их поток не вытесняет из журнала записи,
+по которым процессы сбрасывают L1 точечно.
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+ACCESS_RESOLUTION = 1
+# Предел числа параметров в одном запросе SQLite.
+CHUNK_SIZE = 500
+INTEGER_RANGE = range(-2 ** 63, 2 ** 63)
+MMAP_SIZE = 256 * 1024 * 1024
+# Поколения журнала TieredCache, которые можно догнать без очистки L1,
+# если в OPTIONS не задан CHANGE_LOG_SIZE.
+CHANGE_LOG_SIZE = 100
+MISSING = object()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE TABLE IF NOT EXISTS cache_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    size INTEGER NOT NULL,
+    entries INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO cache_stats VALUES (0, 0, 0);
+CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+    UPDATE cache_stats SET size = size + NEW.size, entries = entries + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+    UPDATE cache_stats SET size = size - OLD.size, entries = entries - 1;
+END;
+CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache
+BEGIN
+    UPDATE cache_stats SET size = size + NEW.size - OLD.size;
+END;
+"""
+
+UPSERT = """
+INSERT INTO cache (key, value, expires, accessed, size)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value, expires = excluded.expires,
+    accessed = excluded.accessed, size = excluded.size
+"""
+NOT_EXPIRED = '(expires IS NULL OR expires > ?)'
+# Просроченная запись считается отсутствующей и перезаписывается.
+ADD = f'{UPSERT} WHERE cache.expires IS NOT NULL AND cache.expires <= ?'
+
+
+def _chunks(items):
+    items = list(items)
+    for start in range(0, len(items), CHUNK_SIZE):
+        yield items[start:start + CHUNK_SIZE]
+
+
+def _placeholders(items):
+    return ', '.join('?' * len(items))
+
+
+def encode(key, value):
+    """Значение для столбца value и размер записи в байтах."""
+    if type(value) is int and value in INTEGER_RANGE:
+        return value, len(key) + 8
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    return data, len(key) + len(data)
+
+
+def decode(value):
+    return value if isinstance(value, int) else pickle.loads(value)
+
+
+class SQLiteCache(BaseCache):
+    """Кеш Django в файле LOCATION (см. описание модуля)."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        options = params.get('OPTIONS', {})
+        self._max_size = options.get('MAX_SIZE')
+        self._connection = None
+        self._pid = None
+
+    @property
+    def connection(self):
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            connection.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+            connection.executescript(SCHEMA)
+            self._connection, self._pid = connection, os.getpid()
+        return self._connection
+
+    def _key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _expires(self, timeout):
+        return self.get_backend_timeout(timeout)
+
+    def _write(self, statements):
+        """Выполняет statements(cursor) в одной транзакции на запись."""
+        cursor = self.connection.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            result = statements(cursor)
+            self._cull(cursor)
+        except BaseException:
+            cursor.execute('ROLLBACK')
+            raise
+        cursor.execute('COMMIT')
+        return result
+
+    def _cull(self, cursor):
+        size, entries = cursor.execute(
+            'SELECT size, entries FROM cache_stats').fetchone()
+        if not self._over_limit(size, entries):
+            return
+        cursor.execute(
+            f'DELETE FROM cache WHERE NOT {NOT_EXPIRED}', (time.time(),))
+        size, entries = cursor.execute(
+            'SELECT size, entries FROM cache_stats').fetchone()
+        while entries and self._over_limit(size, entries):
+            if self._cull_frequency == 0:
+                cursor.execute('DELETE FROM cache')
+            else:
+                cursor.execute(
+                    'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                    'ORDER BY accessed LIMIT ?)',
+                    (max(entries // self._cull_frequency, 1),))
+            size, entries = cursor.execute(
+                'SELECT size, entries FROM cache_stats').fetchone()
+
+    def _over_limit(self, size, entries):
+        return entries > self._max_entries or (
+            self._max_size is not None and size > self._max_size)
+
+    def _fetch(self, keys):
+        """{ключ: значение} живых записей; отмечает время чтения."""
+        now = time.time()
+        found, stale = {}, []
+        for chunk in _chunks(keys):
+            rows = self.connection.execute(
+                f'SELECT key, value, accessed FROM cache '
+                f'WHERE key IN ({_placeholders(chunk)}) AND {NOT_EXPIRED}',
+                (*chunk, now))
+            for key, value, accessed in rows:
+                found[key] = decode(value)
+                if now - accessed > ACCESS_RESOLUTION:
+                    stale.append(key)
+        for chunk in _chunks(stale):
+            self.connection.execute(
+                f'UPDATE cache SET accessed = ? '
+                f'WHERE key IN ({_placeholders(chunk)})', (now, *chunk))
+        return found
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        return self._fetch([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        keys = {self._key(key, version): key for key in keys}
+        return {
+            keys[key]: value for key, value in self._fetch(keys).items()
+        }
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self.connection.execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {NOT_EXPIRED}',
+            (key, time.time())).fetchone() is not None
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now, expires = time.time(), self._expires(timeout)
+        rows = []
+        for key, value in data.items():
+            key = self._key(key, version)
+            rows.append((key, *encode(key, value)))
+        self._write(lambda cursor: cursor.executemany(UPSERT, [
+            (key, value, expires, now, size) for key, value, size in rows
+        ]))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now, expires = time.time(), self._expires(timeout)
+        value, size = encode(key, value)
+        return self._write(lambda cursor: cursor.execute(
+            ADD, (key, value, expires, now, size, now)).rowcount == 1)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return self._write(lambda cursor: cursor.execute(
+            f'UPDATE cache SET expires = ? WHERE key = ? AND {NOT_EXPIRED}',
+            (self._expires(timeout), key, time.time())).rowcount == 1)
+
+    def incr(self, key, delta=1, version=None):
+        now = time.time()
+        row = self._write(lambda cursor: cursor.execute(
+            f'UPDATE cache SET value = value + ?, accessed = ? '
+            f"WHERE key = ? AND typeof(value) = 'integer' AND {NOT_EXPIRED} "
+            f'RETURNING value',
+            (delta, now, self._key(key, version), now)).fetchone())
+        if row is None:
+            raise ValueError(f"Key '{key}' not found")
+        return row[0]
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        return self._write(lambda cursor: cursor.execute(
+            'DELETE FROM cache WHERE key = ?', (key,)).rowcount == 1)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+
+        def delete(cursor):
+            for chunk in _chunks(keys):
+                cursor.execute(
+                    f'DELETE FROM cache WHERE key IN ({_placeholders(chunk)})',
+                    chunk)
+        self._write(delete)
+
+    def clear(self):
+        self._write(lambda cursor: cursor.execute('DELETE FROM cache'))
+
+
+GENERATION_KEY = 'tiered:generation'
+CHANGED_KEY = 'tiered:changed:{}'
+# Простые неизменяемые значения лежат в L1 как есть, прочие — pickle.
+PLAIN_TYPES = (str, bytes, int, float, bool, type(None))
+
+
+def _local_entry(value):
+    if type(value) in PLAIN_TYPES:
+        size = len(value) if isinstance(value, (str, bytes)) else 8
+        return value, size, False
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    return data, len(data), True
+
+
+class LocalTier:
+    """LRU процесса с потолком в байтах, общий для потоков.
+
+    Помнит поколение записей общего кеша, с которым сверялся: раз в
+    check_interval секунд читает поколение и выбрасывает ключи, которые
+    с тех пор поменяли другие процессы.
+    """
+
+    def __init__(self, max_size, check_interval, timeout,
+                 change_log_size=CHANGE_LOG_SIZE):
+        self.max_size = max_size
+        self.check_interval = check_interval
+        self.timeout = timeout
+        self.change_log_size = change_log_size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.size = 0
+        self.generation = None
+        self.checked = 0
+
+    def get(self, key):
+        """(найдено, значение)."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return False, None
+            value, size, pickled, expires = entry
+            if expires <= time.time():
+                self._pop(key)
+                return False, None
+            self.entries.move_to_end(key)
+        return True, pickle.loads(value) if pickled else value
+
+    def put(self, key, value, expires=None):
+        value, size, pickled = _local_entry(value)
+        if size > self.max_size:
+            self.discard([key])
+            return
+        expires = min(
+            expires or float('inf'), time.time() + self.timeout)
+        with self.lock:
+            self._pop(key)
+            self.entries[key] = (value, size, pickled, expires)
+            self.size += size
+            while self.size > self.max_size:
+                self._pop(next(iter(self.entries)))
+
+    def discard(self, keys):
+        with self.lock:
+            for key in keys:
+                self._pop(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def _pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def sync(self, shared):
+        """Сверяется с поколением общего кеша не чаще check_interval."""
+        now = time.time()
+        if now - self.checked < self.check_interval:
+            return
+        self.checked = now
+        generation = shared.get(GENERATION_KEY)
+        if generation == self.generation:
+            return
+        changed = {}
+        if self.generation is not None and generation is not None and (
+                0 < generation - self.generation <= self.change_log_size):
+            changed = shared.get_many([
+                CHANGED_KEY.format(number)
+                for number in range(self.generation + 1, generation + 1)])
+        if len(changed) == (generation or 0) - (self.generation or 0):
+            self.discard(key for keys in changed.values() for key in keys)
+        else:
+            # Журнал не покрывает пропуск: верить нельзя ничему.
+            self.clear()
+        self.generation = generation
+
+
+_local_tiers = {}
+_local_tiers_lock = threading.Lock()
+
+
+class TieredCache(BaseCache):
+    """LRU процесса (L1) перед общим кешем LOCATION (L2).
+
+    LOCATION — алиас кеша L2 в CACHES. Запись идёт в L2 и в L1 своего
+    процесса и отмечается в журнале L2: поколение GENERATION_KEY плюс
+    список ключей этого поколения. Другие процессы увидят запись не
+    позже чем через OPTIONS['CHECK_INTERVAL'] секунд; запись в L1
+    живёт не дольше OPTIONS['LOCAL_TIMEOUT'], L1 занимает не больше
+    OPTIONS['MAX_SIZE'] байт, журнал помнит OPTIONS['CHANGE_LOG_SIZE']
+    поколений. Ключи с окончанием из OPTIONS['SHARED_SUFFIXES']
+    (блокировки core.stampede) читаются и пишутся только в L2 и в
+    журнал не попадают. Ключи и версии строит L2.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._alias = location
+        with _local_tiers_lock:
+            if location not in _local_tiers:
+                _local_tiers[location] = LocalTier(
+                    options.get('MAX_SIZE', 16 * 1024 * 1024),
+                    options.get('CHECK_INTERVAL', 1),
+                    options.get('LOCAL_TIMEOUT', 60),
+                    options.get('CHANGE_LOG_SIZE', CHANGE_LOG_SIZE))
+            self.local = _local_tiers[location]
+        self._shared_suffixes = tuple(
+            options.get('SHARED_SUFFIXES', (':lock',)))
+
+    @property
+    def shared(self):
+        return caches[self._alias]
+
+    def _local_key(self, key, version):
+        return self.shared.make_key(key, version=version)
+
+    def _shared_only(self, key):
+        return key.endswith(self._shared_suffixes)
+
+    def _changed(self, keys):
+        """Отмечает keys в журнале для L1 других процессов."""
+        keys = list(keys)
+        if not keys:
+            return
+        try:
+            generation = self.shared.incr(GENERATION_KEY)
+        except ValueError:
+            # Журнал вытеснен: процессы увидят новое поколение и
+            # очистят L1 целиком.
+            self.shared.add(GENERATION_KEY, int(time.time() * 1000), None)
+            return
+        self.shared.set(
+            CHANGED_KEY.format(generation), keys,
+            self.local.change_log_size * self.local.check_interval)
+
+    def get(self, key, default=None, version=None):
+        if self._shared_only(key):
+            return self.shared.get(key, default, version)
+        self.local.sync(self.shared)
+        local_key = self._local_key(key, version)
+        found, value = self.local.get(local_key)
+        if found:
+            return value
+        value = self.shared.get(key, MISSING, version)
+        if value is MISSING:
+            return default
+        self.local.put(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        self.local.sync(self.shared)
+        result, missing = {}, []
+        for key in keys:
+            found, value = False, None
+            if not self._shared_only(key):
+                found, value = self.local.get(self._local_key(key, version))
+            if found:
+                result[key] = value
+            else:
+                missing.append(key)
+        if missing:
+            fetched = self.shared.get_many(missing, version)
+            for key, value in fetched.items():
+                if not self._shared_only(key):
+                    self.local.put(self._local_key(key, version), value)
+            result.update(fetched)
+        return result
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version) is not MISSING
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version) or []
+        expires = self.shared.get_backend_timeout(timeout)
+        local_keys = []
+        for key, value in data.items():
+            if self._shared_only(key):
+                continue
+            local_key = self._local_key(key, version)
+            local_keys.append(local_key)
+            if key in failed:
+                self.local.discard([local_key])
+            else:
+                self.local.put(local_key, value, expires)
+        self._changed(local_keys)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version)
+        if added and not self._shared_only(key):
+            local_key = self._local_key(key, version)
+            self.local.put(
+                local_key, value, self.shared.get_backend_timeout(timeout))
+            self._changed([local_key])
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        # Значение не меняется, а новый срок L1 не знает: запись в L1
+        # других процессов доживает до LOCAL_TIMEOUT.
+        self.local.discard([self._local_key(key, version)])
+        return self.shared.touch(key, timeout, version)
+
+    def incr(self, key, delta=1, version=None):
+        if self._shared_only(key):
+            return self.shared.incr(key, delta, version)
+        local_key = self._local_key(key, version)
+        self.local.discard([local_key])
+        value = self.shared.incr(key, delta, version)
+        self._changed([local_key])
+        return value
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        local_keys = [
+            self._local_key(key, version)
+            for key in keys if not self._shared_only(key)
+        ]
+        self.local.discard(local_keys)
+        self.shared.delete_many(keys, version)
+        self._changed(local_keys)
+
+    def clear(self):
+        # Вместе с L2 стирается журнал: остальные процессы очистят L1.
+        self.local.clear()
+        self.shared.clear()
@@ -0,0 +1,127 @@
+"""Инвалидация кеша по зависимостям от строк и наборов моделей.
+
+Зависимость — строка вида 'post:5' (одна строка), 'posts:author:3'
+(посты автора) или 'posts' (все посты). У каждой в кеше лежит счётчик
+поколений. Закешированный фрагмент или страница запоминает поколения
+своих зависимостей (versions(), version(), depend()) и устаревает,
+когда любое из них сменится.
+
+Поколения повышает track(): для модели задаётся функция, которая по
+объекту возвращает его зависимости, и сигналы post_save/post_delete
+повышают их — и для нового состояния объекта, и для прежнего (пост мог
+уйти из группы). Сохранение, не изменившее поля fields, ничего не
+трогает. Поэтому записи в кеше могут жить долго.
+
+Поколения повышаются после фиксации транзакции: иначе запрос, успевший
+между повышением и фиксацией, положил бы в кеш прежние данные под
+новым поколением.
+"""
+import time
+from functools import partial
+from types import SimpleNamespace
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+
+KEY_PREFIX = 'dep'
+# Входит в зависимости всех записей: expire(ALL) сбрасывает всё.
+ALL = 'all'
+
+
+def _key(dependency):
+    return f'{KEY_PREFIX}:{dependency}'
+
+
+def _initial_version():
+    # Вытесненный из кеша счётчик продолжается с текущего времени, а не
+    # с единицы: старые записи под ним не оживут.
+    return int(time.time() * 1000)
+
+
+def versions(dependencies):
+    """{зависимость: поколение} одним обращением к кешу."""
+    keys = {_key(dependency): dependency for dependency in dependencies}
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        cache.add(key, _initial_version(), None)
+        found[key] = cache.get(key)
+    return {keys[key]: version for key, version in found.items()}
+
+
+def _stamp(current):
+    return '.'.join(str(current[name]) for name in sorted(current))
+
+
+def version(*dependencies):
+    """Строка поколений зависимостей: версия фрагмента {% cache %}."""
+    return _stamp(versions({ALL, *dependencies}))
+
+
+def depend(request, *dependencies):
+    """Отмечает зависимости страницы для core.pagecache; версия для
+    фрагментов этой страницы.
+
+    Поколения читаются сейчас, до выборок: запись, случившаяся во
+    время рендера, не оставит в кеше устаревшую страницу.
+    """
+    current = versions({ALL, *dependencies})
+    if not hasattr(request, 'page_cache_versions'):
+        request.page_cache_versions = {}
+    request.page_cache_versions.update(current)
+    return _stamp(current)
+
+
+def expire(*dependencies):
+    """Сбрасывает всё, что зависит от любой из dependencies."""
+    for dependency in set(dependencies):
+        key = _key(dependency)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_version(), None)
+
+
+def _prepared(instance, name):
+    """Значение поля в том виде, в каком его вернёт values()."""
+    field = instance._meta.get_field(name)
+    return field.get_prep_value(getattr(instance, name))
+
+
+def track(model, dependencies, fields=None):
+    """Повышает поколения dependencies(obj) при записи model.
+
+    fields — атрибуты, от которых зависит результат dependencies и
+    видимое содержимое; сохранение без их изменения пропускается.
+    Без fields повышаются при любом сохранении.
+    """
+    def remember(sender, instance, raw=False, **kwargs):
+        instance._dependency_state = None
+        if fields and not raw and not instance._state.adding:
+            old = sender._default_manager.filter(
+                pk=instance.pk).values(*fields).first()
+            if old is not None:
+                # Прежнее состояние: текущие атрибуты с полями из базы.
+                instance._dependency_state = SimpleNamespace(
+                    **{**vars(instance), 'pk': instance.pk, **old})
+
+    def saved(sender, instance, created=False, raw=False, **kwargs):
+        if raw:
+            return
+        old = getattr(instance, '_dependency_state', None)
+        if old is not None and all(
+                _prepared(instance, name) == getattr(old, name)
+                for name in fields):
+            return
+        names = list(dependencies(instance))
+        if old is not None:
+            names.extend(dependencies(old))
+        transaction.on_commit(partial(expire, *names))
+
+    def deleted(sender, instance, **kwargs):
+        transaction.on_commit(partial(expire, *dependencies(instance)))
+
+    uid = f'dependencies.{model._meta.label}'
+    pre_save.connect(remember, sender=model, weak=False, dispatch_uid=uid)
+    post_save.connect(saved, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(deleted, sender=model, weak=False, dispatch_uid=uid)
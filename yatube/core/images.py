@@ -0,0 +1,133 @@
+"""Приём загруженных картинок.
+
+Перед сохранением картинка поворачивается по EXIF, уменьшается до
+IMAGE_MAX_DIMENSIONS и пережимается без метаданных (цветовой профиль
+остаётся): JPEG, а при прозрачности — PNG. Рядом с мастером пишутся
+WebP-варианты: полного размера и по ширинам IMAGE_WEBP_WIDTHS.
+Анимации сохраняются как есть. WebP пишется, только если Pillow
+собран с его поддержкой.
+
+Поля картинок остаются обычными ImageField: пережатие делает
+хранилище IngestStorage, ограничения — валидатор validate_upload.
+"""
+import os
+from io import BytesIO
+
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps, features
+
+from yatube.settings import (
+    IMAGE_JPEG_QUALITY, IMAGE_MAX_DIMENSIONS, IMAGE_UPLOAD_MAX_SIZE,
+    IMAGE_WEBP_QUALITY, IMAGE_WEBP_WIDTHS, THUMBNAIL_MAX_PIXELS)
+
+WEBP_EXTENSION = '.webp'
+
+
+class IngestedImage(ContentFile):
+    """Пережатый мастер и его WebP-варианты {ширина или None: байты}."""
+
+    def __init__(self, content, name, variants):
+        super().__init__(content, name)
+        self.variants = variants
+
+
+def webp_name(name, width=None):
+    """Имя WebP-варианта картинки name (None — полный размер)."""
+    # Расширение мастера остаётся в имени: a.png и a.jpg не столкнутся.
+    suffix = f'.{width}w' if width else ''
+    return f'{name}{suffix}{WEBP_EXTENSION}'
+
+
+def validate_upload(file_):
+    """Ограничения на загрузку: размер файла и число пикселей."""
+    if getattr(file_, '_committed', False):
+        return
+    if file_.size > IMAGE_UPLOAD_MAX_SIZE:
+        raise ValidationError(
+            'Файл больше %(limit)s.',
+            code='file_too_large',
+            params={'limit': filesizeformat(IMAGE_UPLOAD_MAX_SIZE)},
+        )
+    file_.seek(0)
+    # Image.open читает только заголовок, пиксели не декодируются.
+    width, height = Image.open(file_).size
+    file_.seek(0)
+    if width * height > THUMBNAIL_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка больше %(limit)s Мп.',
+            code='too_many_pixels',
+            params={'limit': THUMBNAIL_MAX_PIXELS // 1_000_000},
+        )
+
+
+def _encode(image, image_format, **options):
+    output = BytesIO()
+    image.save(output, image_format, **options)
+    return output.getvalue()
+
+
+def ingest(file_, name):
+    """IngestedImage из загруженного файла или None для анимаций."""
+    file_.seek(0)
+    image = Image.open(file_)
+    if getattr(image, 'is_animated', False):
+        return None
+    icc_profile = image.info.get('icc_profile')
+    if image.format == 'JPEG':
+        image.draft('RGB', IMAGE_MAX_DIMENSIONS)
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ('RGBA', 'LA') or (
+        image.mode == 'P' and 'transparency' in image.info)
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    image.thumbnail(IMAGE_MAX_DIMENSIONS, Image.LANCZOS)
+    profile = {'icc_profile': icc_profile} if icc_profile else {}
+    if has_alpha:
+        extension = '.png'
+        content = _encode(image, 'PNG', optimize=True, **profile)
+    else:
+        extension = '.jpg'
+        content = _encode(
+            image, 'JPEG', quality=IMAGE_JPEG_QUALITY, optimize=True,
+            progressive=True, **profile)
+    variants = {}
+    if features.check('webp'):
+        variants[None] = _encode(
+            image, 'WEBP', quality=IMAGE_WEBP_QUALITY, method=6, **profile)
+    for width in IMAGE_WEBP_WIDTHS:
+        if width < image.width and variants:
+            resized = image.resize(
+                (width, round(image.height * width / image.width)),
+                Image.LANCZOS)
+            variants[width] = _encode(
+                resized, 'WEBP', quality=IMAGE_WEBP_QUALITY, **profile)
+    name = os.path.splitext(name)[0] + extension
+    return IngestedImage(content, name, variants)
+
+
+def variant_names(name):
+    """Имена всех возможных WebP-вариантов картинки name."""
+    return [webp_name(name, width) for width in (None, *IMAGE_WEBP_WIDTHS)]
+
+
+class IngestStorage(FileSystemStorage):
+    """Хранилище, которое пропускает сохраняемые картинки через ingest()."""
+
+    def save(self, name, content, max_length=None):
+        ingested = ingest(content, name)
+        if ingested is None:
+            return super().save(name, content, max_length)
+        name = super().save(ingested.name, ingested, max_length)
+        self.save_variants(name, ingested)
+        return name
+
+    def save_variants(self, name, ingested):
+        for width, data in ingested.variants.items():
+            self._save(webp_name(name, width), ContentFile(data))
+
+    def delete(self, name):
+        for variant in variant_names(name):
+            super().delete(variant)
+        super().delete(name)
@@ -0,0 +1,201 @@
+"""Сборка мусора в MEDIA_ROOT.
+
+Два прохода, оба потоковые и пачками:
+
+* индекс миниатюр: записи sorl-thumbnail идут по ключу; у источников,
+  на которые не ссылается ни одно поле media_storage, удаляются
+  миниатюры и их записи;
+* файлы: дерево MEDIA_ROOT обходится в порядке путей, по одному
+  каталогу за раз. Картинка (и её WebP-варианты) жива, пока на неё
+  ссылается поле модели, миниатюра — пока о ней знает индекс sorl.
+  Обход можно прервать и продолжить с пути (start_after).
+
+Свежие файлы (моложе min_age) не трогаются: загрузка сохраняется на
+диск раньше, чем фиксируется ссылающаяся на неё строка. Повторная
+загрузка файла без ссылок освежает его время (DedupStorage.reference)
+под блокировкой строки MediaBlob; под той же блокировкой время
+проверяется ещё раз перед удалением.
+"""
+import datetime
+import posixpath
+import re
+from types import SimpleNamespace
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from . import thumbnails
+from .models import MediaBlob
+from .signals import media_fields
+from .storage import media_storage
+
+VARIANT_SUFFIX = re.compile(r'(\.\d+w)?\.webp$')
+
+
+def _fields():
+    return [
+        (model, field)
+        for model in apps.get_models() for field in media_fields(model)
+    ]
+
+
+def referenced(names):
+    """Имена из names, на которые ссылаются поля моделей."""
+    found = set()
+    for model, field in _fields():
+        found.update(model._default_manager.filter(
+            **{f'{field.name}__in': names}).values_list(
+                field.name, flat=True))
+    return found
+
+
+def master_name(name):
+    """Имя картинки, WebP-вариантом которой может быть name."""
+    master = VARIANT_SUFFIX.sub('', name, count=1)
+    if master != name and '.' in posixpath.basename(master):
+        return master
+    return None
+
+
+def _path_key(path):
+    return path.split('/')
+
+
+def walk(storage, directory='', start_after=''):
+    """Пути файлов в порядке _path_key, строго после start_after."""
+    cursor = _path_key(start_after) if start_after else None
+    directories, files = storage.listdir(directory)
+    entries = sorted(
+        [(name, True) for name in directories]
+        + [(name, False) for name in files])
+    for name, is_directory in entries:
+        path = f'{directory}/{name}' if directory else name
+        key = _path_key(path)
+        if is_directory:
+            # Каталог целиком до курсора пропускается без обхода.
+            if cursor is None or key >= cursor[:len(key)]:
+                yield from walk(storage, path, start_after)
+        elif cursor is None or key > cursor:
+            yield path
+
+
+def batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Collector:
+    """Находит и (если не dry_run) удаляет мусор, считая файлы и байты."""
+
+    def __init__(self, dry_run=False, min_age=3600, batch_size=500):
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.cutoff = timezone.now() - datetime.timedelta(seconds=min_age)
+        self.files = self.bytes = 0
+        self.storage = media_storage
+        self.prefix = thumbnail_settings.THUMBNAIL_PREFIX
+
+    def _remove(self, storage, name):
+        if not storage.exists(name):
+            return
+        self.files += 1
+        self.bytes += storage.size(name)
+        if not self.dry_run:
+            # Мимо DedupStorage.delete: ссылок на файл уже нет.
+            FileSystemStorage.delete(storage, name)
+
+    def collect_thumbnail_index(self):
+        """Проход по индексу sorl: миниатюры источников без ссылок."""
+        lists = KVStore.objects.filter(key__startswith=add_prefix(
+            '', 'thumbnails')).order_by('key').values_list('key', flat=True)
+        last = ''
+        while True:
+            keys = list(lists.filter(key__gt=last)[:self.batch_size])
+            if not keys:
+                return
+            last = keys[-1]
+            sources = {key.rsplit('||', 1)[1]: None for key in keys}
+            for key, value in KVStore.objects.filter(key__in=[
+                    add_prefix(source) for source in sources]).values_list(
+                        'key', 'value'):
+                sources[key.rsplit('||', 1)[1]] = deserialize_image_file(
+                    value)
+            live = referenced(
+                [source.name for source in sources.values() if source])
+            for key, source in sources.items():
+                if source is None or source.name not in live:
+                    self._drop_thumbnails(source or SimpleNamespace(key=key))
+
+    def _drop_thumbnails(self, source):
+        kvstore = default.kvstore
+        for key in kvstore._get(source.key, identity='thumbnails') or ():
+            thumbnail = kvstore._get(key)
+            if thumbnail:
+                self._remove(thumbnail.storage, thumbnail.name)
+        if self.dry_run:
+            return
+        if isinstance(source, ImageFile):
+            thumbnails.forget(source.name)
+            kvstore.delete(source, delete_thumbnails=False)
+        else:
+            kvstore.delete_thumbnails(source)
+
+    def collect_files(self, start_after='', max_batches=None):
+        """Проход по файлам; возвращает последний обработанный путь."""
+        if not self.storage.exists(''):
+            return None
+        last = start_after
+        paths = walk(self.storage, start_after=start_after)
+        for number, batch in enumerate(batches(paths, self.batch_size)):
+            if max_batches is not None and number >= max_batches:
+                return last
+            self._collect_batch(batch)
+            last = batch[-1]
+        return None
+
+    def _is_old(self, path):
+        return self.storage.get_modified_time(path) < self.cutoff
+
+    def _collect_batch(self, paths):
+        paths = [path for path in paths if self._is_old(path)]
+        thumbnails = [path for path in paths if path.startswith(self.prefix)]
+        media = [path for path in paths if not path.startswith(self.prefix)]
+        indexed = {
+            key for key in KVStore.objects.filter(key__in=[
+                add_prefix(ImageFile(path, default.storage).key)
+                for path in thumbnails]).values_list('key', flat=True)
+        }
+        for path in thumbnails:
+            key = add_prefix(ImageFile(path, default.storage).key)
+            if key not in indexed:
+                self._remove(default.storage, path)
+        masters = {path: master_name(path) for path in media}
+        live = referenced(
+            list({*media, *filter(None, masters.values())}))
+        dead = [
+            path for path in media
+            if path not in live and masters[path] not in live
+        ]
+        if not dead:
+            return
+        with transaction.atomic():
+            list(MediaBlob.objects.select_for_update().filter(
+                name__in={masters[path] or path for path in dead}))
+            dead = [path for path in dead if self._is_old(path)]
+            for path in dead:
+                self._remove(self.storage, path)
+            if not self.dry_run:
+                MediaBlob.objects.filter(name__in=dead).delete()
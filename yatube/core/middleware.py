@@ -0,0 +1,21 @@
+from core import staticfiles
+from yatube.settings import STATIC_URL
+
+
+class StaticFilesMiddleware:
+    """Отдаёт собранную статику до сессий, CSRF и аутентификации.
+
+    Файлы, которых нет в STATIC_ROOT, достаются следующим обработчикам.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path.startswith(
+                STATIC_URL):
+            response = staticfiles.serve(
+                request, request.path[len(STATIC_URL):])
+            if response is not None:
+                return response
+        return self.get_response(request)
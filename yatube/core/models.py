@@ -0,0 +1,15 @@
+from django.db import models
+
+
+class MediaBlob(models.Model):
+    """Файл в хранилище по хешу содержимого и число ссылок на него."""
+    name = models.CharField(max_length=100, primary_key=True)
+    size = models.BigIntegerField('Размер')
+    refcount = models.PositiveIntegerField('Число ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Файл медиа'
+        verbose_name_plural = 'Файлы медиа'
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,99 @@
+"""Полностраничный кеш для гостей.
+
+Ответ кешируется целиком по адресу с параметрами, если представление
+объявило зависимости страницы (core.dependencies.depend()): например,
+посты автора, группу и комментарии поста. Запись страницы хранит их
+поколения и устаревает, когда запись в базу повысит любое из них.
+Гостем считается запрос без cookie сессии: такой ответ не зависит от
+пользователя, и его можно отдать, не доходя до сессий и базы.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+from yatube.settings import PAGE_CACHE_TIMEOUT
+from . import dependencies, stampede
+
+KEY_PREFIX = 'page'
+UNCACHEABLE_CONTROLS = ('private', 'no-cache', 'no-store')
+
+
+def _page_key(request):
+    url = request.build_absolute_uri()
+    return f'{KEY_PREFIX}:{hashlib.md5(url.encode()).hexdigest()}'
+
+
+def _cacheable(request, response):
+    control = response.get('Cache-Control', '')
+    return (
+        getattr(request, 'page_cache_versions', None)
+        and request.method == 'GET'
+        and response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and not request.META.get('CSRF_COOKIE_USED')
+        and not any(value in control for value in UNCACHEABLE_CONTROLS)
+    )
+
+
+class PageCacheMiddleware:
+    """Отдаёт гостям страницы из кеша с заголовками X-Cache и Age.
+
+    Устаревшую страницу (сменилось поколение зависимости или подошёл
+    срок, см. core.stampede) пересчитывает один запрос; остальные тем
+    временем получают прошлую копию с X-Cache: STALE. Без записи в кеше
+    блокировка не берётся: большинство адресов (поиск, формы)
+    не кешируется вовсе.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if (not PAGE_CACHE_TIMEOUT
+                or request.method not in ('GET', 'HEAD')
+                or settings.SESSION_COOKIE_NAME in request.COOKIES):
+            return self.get_response(request)
+        key = _page_key(request)
+        entry = cache.get(key)
+        page = entry and entry['value']
+        if page and stampede.is_fresh(entry) and (
+                dependencies.versions(page['versions']) == page['versions']):
+            return self.respond(request, page, 'HIT')
+        if not page:
+            return self.render(request, key)
+        with stampede.recompute_lock(key) as acquired:
+            if acquired:
+                return self.render(request, key)
+        return self.respond(request, page, 'STALE')
+
+    def render(self, request, key):
+        started = time.monotonic()
+        response = self.get_response(request)
+        if _cacheable(request, response):
+            page = {
+                'content': response.content,
+                'status': response.status_code,
+                'headers': list(response.items()),
+                'time': time.time(),
+                'versions': request.page_cache_versions,
+            }
+            stampede.store(key, stampede.make_entry(
+                page, PAGE_CACHE_TIMEOUT,
+                delta=time.monotonic() - started), PAGE_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def respond(self, request, page, status):
+        response = HttpResponse(page['content'], status=page['status'])
+        for header, value in page['headers']:
+            response[header] = value
+        response = get_conditional_response(
+            request, etag=response.get('ETag'), response=response)
+        response['X-Cache'] = status
+        response['Age'] = int(time.time() - page['time'])
+        return response
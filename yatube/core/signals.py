@@ -0,0 +1,62 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_init, post_save, pre_save)
+
+from .storage import is_blob, media_storage
+
+
+def media_fields(model):
+    """Файловые поля модели, которые хранятся в media_storage."""
+    return [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'storage', None) is media_storage
+    ]
+
+
+def _name(value):
+    return getattr(value, 'name', value) or ''
+
+
+def _release(name):
+    # Ссылки ведутся только на файлы по хешу; старые файлы остаются
+    # до manage.py dedupe_media.
+    if is_blob(name):
+        transaction.on_commit(partial(media_storage.delete, name))
+
+
+def remember_names(sender, instance, **kwargs):
+    """Запоминает имена файлов, чтобы при сохранении знать замену."""
+    instance._media_names = {
+        field.attname: _name(instance.__dict__[field.attname])
+        for field in media_fields(sender)
+        if field.attname in instance.__dict__
+    }
+
+
+def release_replaced(sender, instance, raw=False, **kwargs):
+    """Снимает ссылку со старого файла, если поле поменялось."""
+    if raw or instance._state.adding:
+        return
+    names = getattr(instance, '_media_names', {})
+    for field in media_fields(sender):
+        if field.attname not in names:
+            # Поле было отложено (only/defer): старое имя неизвестно.
+            continue
+        current = _name(instance.__dict__.get(field.attname))
+        if names[field.attname] != current:
+            _release(names[field.attname])
+
+
+def release_deleted(sender, instance, **kwargs):
+    for field in media_fields(sender):
+        _release(_name(instance.__dict__.get(field.attname)))
+
+
+def connect(model):
+    """Подключает учёт ссылок на media_storage для модели."""
+    post_init.connect(remember_names, sender=model)
+    pre_save.connect(release_replaced, sender=model)
+    post_save.connect(remember_names, sender=model)
+    post_delete.connect(release_deleted, sender=model)
@@ -0,0 +1,105 @@
+"""Защита закешированных фрагментов и страниц от лавины пересчётов.
+
+Когда запись ленты устаревает, пересчитать её пытаются все запросы,
+пришедшие одновременно. Здесь:
+
+* запись хранит значение, версию, срок свежести и время пересчёта;
+* запись считается устаревшей чуть раньше срока со случайным сдвигом,
+  пропорциональным времени пересчёта (вероятностное раннее обновление,
+  XFetch): обычно её обновляет один запрос до того, как истечёт срок;
+* пересчитывает только взявший блокировку (cache.add); остальные
+  отдают устаревшее значение, а если его нет — ждут свежего;
+* в кеше запись живёт на STAMPEDE_STALE_TIMEOUT дольше срока свежести,
+  чтобы было что отдать во время пересчёта.
+"""
+import math
+import random
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+from yatube.settings import (
+    STAMPEDE_BETA, STAMPEDE_LOCK_TIMEOUT, STAMPEDE_STALE_TIMEOUT,
+    STAMPEDE_WAIT)
+
+POLL_INTERVAL = 0.05
+
+
+def make_entry(value, timeout, version=None, delta=0):
+    return {
+        'value': value,
+        'version': version,
+        'expires': time.time() + timeout,
+        'delta': delta,
+    }
+
+
+def is_fresh(entry, version=None, beta=STAMPEDE_BETA):
+    """Свежа ли запись с учётом раннего обновления."""
+    if entry is None or entry['version'] != version:
+        return False
+    # Экспоненциально распределённый сдвиг: чем ближе срок и дольше
+    # пересчёт, тем вероятнее обновить запись заранее.
+    early = entry['delta'] * beta * -math.log(1 - random.random())
+    return time.time() + early < entry['expires']
+
+
+def store(key, entry, timeout):
+    cache.set(key, entry, timeout + STAMPEDE_STALE_TIMEOUT)
+
+
+@contextmanager
+def recompute_lock(key):
+    """Блокировка пересчёта key; в with приходит True, если взята."""
+    lock_key = f'{key}:lock'
+    token = uuid.uuid4().hex
+    acquired = cache.add(lock_key, token, STAMPEDE_LOCK_TIMEOUT)
+    try:
+        yield acquired
+    finally:
+        if acquired and cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+def wait(key, version=None):
+    """Ждёт, пока другой запрос положит свежую запись; иначе None."""
+    deadline = time.monotonic() + STAMPEDE_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        # Сначала блокировка: запись кладётся до её снятия.
+        locked = cache.has_key(f'{key}:lock')
+        entry = cache.get(key)
+        if entry is not None and entry['version'] == version:
+            return entry
+        if not locked:
+            return None
+    return None
+
+
+def fetch(key, compute, timeout, version=None):
+    """Значение key; compute() выполняется одним запросом за раз."""
+    entry = cache.get(key)
+    if is_fresh(entry, version):
+        return entry['value']
+    with recompute_lock(key) as acquired:
+        if acquired:
+            # Между чтением и блокировкой запись мог обновить другой
+            # запрос.
+            entry = cache.get(key)
+            if is_fresh(entry, version):
+                return entry['value']
+            started = time.monotonic()
+            value = compute()
+            store(key, make_entry(
+                value, timeout, version, time.monotonic() - started),
+                timeout)
+            return value
+    if entry is not None:
+        return entry['value']
+    entry = wait(key, version)
+    if entry is not None:
+        return entry['value']
+    # Пересчитывающий не успел: считаем сами, не трогая кеш.
+    return compute()
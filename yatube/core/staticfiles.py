@@ -0,0 +1,156 @@
+"""Статика с хешем содержимого в именах и заранее сжатыми копиями.
+
+collectstatic кладёт в STATIC_ROOT файлы с хешем в имени (манифест
+ManifestStaticFilesStorage), а рядом с текстовыми — .gz и .br (пакет
+brotli из requirements.txt; без него — только .gz). Отдаёт их
+StaticFilesMiddleware: сжатую копию по Accept-Encoding, хешированные
+имена — с заголовком immutable на год, остальные — с обязательной
+перепроверкой.
+"""
+import gzip
+import mimetypes
+import os
+
+from django.contrib.staticfiles.storage import (
+    ManifestStaticFilesStorage, staticfiles_storage)
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from yatube.settings import STATIC_ROOT
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = (
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.xml',
+    '.html', '.ico',
+)
+# Сжатая копия хранится, только если она заметно меньше исходника.
+MIN_RATIO = 0.9
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def _gzip(data):
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+
+# (Content-Encoding, суффикс копии, сжатие) в порядке предпочтения.
+ENCODINGS = [('gzip', '.gz', _gzip)]
+if brotli is not None:
+    ENCODINGS.insert(0, ('br', '.br', _brotli))
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # Без collectstatic (разработка, тесты) {% static %} отдаёт имя
+    # без хеша, а не падает.
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(
+                paths, dry_run, **options):
+            yield name, hashed_name, processed
+            if isinstance(hashed_name, str):
+                names.update((name, hashed_name))
+        if dry_run:
+            return
+        for name in sorted(names):
+            if name.endswith(COMPRESSIBLE):
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as file_:
+            data = file_.read()
+        for _, suffix, compressor in ENCODINGS:
+            compressed = compressor(data)
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            if len(compressed) < len(data) * MIN_RATIO:
+                self._save(name + suffix, ContentFile(compressed))
+
+
+def _accepted_encodings(header):
+    encodings = set()
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = params.strip().partition('q=')[2]
+        try:
+            if quality and float(quality) == 0:
+                continue
+        except ValueError:
+            continue
+        encodings.add(coding.strip().lower())
+    return encodings
+
+
+_hashed_names = None
+
+
+def is_hashed(name):
+    """Имя из манифеста collectstatic, то есть с хешем содержимого."""
+    global _hashed_names
+    if _hashed_names is None:
+        _hashed_names = set(
+            getattr(staticfiles_storage, 'hashed_files', {}).values())
+    return name in _hashed_names
+
+
+def _file_response(request, path):
+    content_type, _ = mimetypes.guess_type(path)
+    accepted = _accepted_encodings(
+        request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    encoding = None
+    for coding, suffix, _ in ENCODINGS:
+        if coding in accepted and os.path.isfile(path + suffix):
+            path, encoding = path + suffix, coding
+            break
+    response = FileResponse(open(path, 'rb'))
+    # Тип — по исходному имени, а не по суффиксу сжатой копии.
+    response['Content-Type'] = content_type or 'application/octet-stream'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
+
+
+def serve(request, name):
+    """Ответ с файлом name из STATIC_ROOT или None, если файла нет."""
+    try:
+        path = safe_join(STATIC_ROOT, name)
+    except SuspiciousFileOperation:
+        return None
+    if not os.path.isfile(path):
+        return None
+    stat = os.stat(path)
+    if was_modified_since(
+            request.META.get('HTTP_IF_MODIFIED_SINCE'),
+            stat.st_mtime, stat.st_size):
+        response = _file_response(request, path)
+        response['Last-Modified'] = http_date(stat.st_mtime)
+    else:
+        response = HttpResponseNotModified()
+    if name.endswith(COMPRESSIBLE):
+        patch_vary_headers(response, ('Accept-Encoding',))
+    if is_hashed(name):
+        patch_cache_control(
+            response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(
+            response, public=True, max_age=0, must_revalidate=True)
+    return response
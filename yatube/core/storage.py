@@ -0,0 +1,140 @@
+"""Медиа по хешу содержимого.
+
+Картинка (после ingest()) сохраняется под именем
+content/<2 символа хеша>/<sha256>.<расширение>, поэтому одинаковые
+файлы хранятся один раз, а их миниатюры sorl-thumbnail, ключ которых
+строится по имени источника, общие. Число ссылок на файл ведёт
+MediaBlob: save() его увеличивает, delete() уменьшает и удаляет файл,
+его WebP-варианты и миниатюры, когда ссылок не осталось. Ссылки
+моделей освобождают сигналы core.signals. Файлы, загруженные до
+перехода, переносит manage.py dedupe_media.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from functools import partial
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F
+
+from . import thumbnails
+from .images import (
+    IngestStorage, IngestedImage, ingest, variant_names, webp_name)
+from .models import MediaBlob
+
+CONTENT_DIR = 'content'
+BLOB_NAME = re.compile(
+    rf'^{CONTENT_DIR}/[0-9a-f]{{2}}/[0-9a-f]{{64}}\.\w+$')
+CHUNK_SIZE = 64 * 1024
+
+
+def is_blob(name):
+    return bool(BLOB_NAME.match(name or ''))
+
+
+def blob_name(digest, extension):
+    return f'{CONTENT_DIR}/{digest[:2]}/{digest}{extension.lower()}'
+
+
+def hash_file(file_):
+    digest = hashlib.sha256()
+    file_.seek(0)
+    for chunk in iter(partial(file_.read, CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file_.seek(0)
+    return digest.hexdigest()
+
+
+class DedupStorage(IngestStorage):
+    """IngestStorage с именами по хешу и подсчётом ссылок."""
+
+    def save(self, name, content, max_length=None):
+        content = ingest(content, name) or content
+        extension = os.path.splitext(
+            content.name if isinstance(content, IngestedImage) else name)[1]
+        name = blob_name(hash_file(content), extension)
+        if self.reference(name, content.size):
+            self._write(name, content)
+            if isinstance(content, IngestedImage):
+                for width, data in content.variants.items():
+                    self._write(webp_name(name, width), ContentFile(data))
+        return name
+
+    def delete(self, name):
+        if not is_blob(name):
+            super().delete(name)
+            return
+        with transaction.atomic():
+            blob = MediaBlob.objects.select_for_update().filter(
+                name=name).first()
+            if blob and blob.refcount > 1:
+                MediaBlob.objects.filter(name=name).update(
+                    refcount=F('refcount') - 1)
+                return
+            if blob:
+                blob.delete()
+            # Файл удаляется, только если обнуление ссылок зафиксировано.
+            transaction.on_commit(partial(self.remove, name))
+
+    def reference(self, name, size, count=1):
+        """Добавляет count ссылок на name; True — если файла ещё нет."""
+        with transaction.atomic():
+            blob, created = MediaBlob.objects.select_for_update(
+            ).get_or_create(name=name, defaults={'size': size})
+            MediaBlob.objects.filter(name=name).update(
+                refcount=F('refcount') + count)
+            if not created:
+                self.touch(name)
+        return created or not self.exists(name)
+
+    def touch(self, name):
+        """Освежает время файла name и его вариантов.
+
+        Повторно загруженный файл, бывший без ссылок, снова молод:
+        core.media_gc не удалит его, пока не зафиксирована ссылка.
+        """
+        for path in (name, *variant_names(name)):
+            try:
+                os.utime(self.path(path))
+            except FileNotFoundError:
+                pass
+
+    def remove(self, name):
+        """Удаляет файл name, его WebP-варианты и миниатюры."""
+        thumbnails.forget(name)
+        super().delete(name)
+
+    def content_name(self, name):
+        """Имя по хешу, под которым лёг бы файл name."""
+        with self.open(name) as file_:
+            return blob_name(hash_file(file_), os.path.splitext(name)[1])
+
+    def adopt(self, name, target):
+        """Копирует старый файл name и его варианты под имя target.
+
+        Исходник не трогается: ссылки на копию переключает и старый
+        файл удаляет вызывающий (manage.py dedupe_media).
+        """
+        for source, destination in zip(
+                [name, *variant_names(name)],
+                [target, *variant_names(target)]):
+            if self.exists(source) and not self.exists(destination):
+                with self.open(source) as file_:
+                    self._write(destination, file_)
+
+    def _write(self, name, content):
+        """Атомарная запись: одинаковый файл могут писать двое сразу."""
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+                dir=directory, delete=False) as output:
+            for chunk in content.chunks():
+                output.write(chunk)
+        os.chmod(output.name, self.file_permissions_mode or 0o644)
+        os.replace(output.name, path)
+
+
+media_storage = DedupStorage()
@@ -0,0 +1,56 @@
+"""{% cache %} с защитой от лавины пересчётов (core.stampede).
+
+Синтаксис как у встроенного тега, плюс необязательный version=...:
+
+    {% cache timeout fragment_name [vary_on ...] [version=expr] %}
+
+Версия не входит в ключ, а хранится в записи: после записи в ленты
+фрагмент пересчитывает один запрос, остальные пока отдают прошлый.
+"""
+from django import template
+from django.core.cache.utils import make_template_fragment_key
+from django.template.base import token_kwargs
+
+from core import stampede
+
+register = template.Library()
+
+
+class FragmentCacheNode(template.Node):
+    def __init__(self, nodelist, timeout, fragment_name, vary_on, version):
+        self.nodelist = nodelist
+        self.timeout = timeout
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+        self.version = version
+
+    def render(self, context):
+        try:
+            timeout = int(self.timeout.resolve(context))
+        except (ValueError, TypeError):
+            raise template.TemplateSyntaxError(
+                f'Срок {{% cache %}} должен быть числом, а не '
+                f'{self.timeout.var!r}')
+        key = make_template_fragment_key(
+            self.fragment_name,
+            [var.resolve(context) for var in self.vary_on])
+        version = self.version.resolve(context) if self.version else None
+        return stampede.fetch(
+            key, lambda: self.nodelist.render(context), timeout, version)
+
+
+@register.tag('cache')
+def do_cache(parser, token):
+    nodelist = parser.parse(('endcache',))
+    parser.delete_first_token()
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            f'{bits[0]!r} принимает как минимум два аргумента.')
+    version = None
+    if bits[-1].startswith('version='):
+        version = token_kwargs(bits[-1:], parser)['version']
+        bits = bits[:-1]
+    return FragmentCacheNode(
+        nodelist, parser.compile_filter(bits[1]), bits[2],
+        [parser.compile_filter(bit) for bit in bits[3:]], version)
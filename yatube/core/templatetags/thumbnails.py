@@ -0,0 +1,34 @@
+from django import template
+
+from core import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail_variant(image, alias, prefetched=None):
+    """Готовые миниатюры (Responsive) или None: ресайза в запросе нет.
+
+    Если страница прошла через {% prefetch_thumbnails %}, в prefetched
+    лежат уже найденные миниатюры объекта.
+    """
+    if not image:
+        return None
+    if isinstance(prefetched, dict) and alias in prefetched:
+        return prefetched[alias]
+    return thumbnails.responsive([image], alias)[image.name]
+
+
+@register.simple_tag
+def prefetch_thumbnails(objects, alias, field='image'):
+    """Ищет миниатюры всех объектов страницы одним обращением.
+
+    Результат кладётся в obj.thumbnails[alias] каждого объекта.
+    """
+    objects = list(objects)
+    images = [getattr(obj, field) for obj in objects]
+    found = thumbnails.responsive(images, alias)
+    for obj, image in zip(objects, images):
+        obj.thumbnails = getattr(obj, 'thumbnails', {})
+        obj.thumbnails[alias] = found.get(image.name) if image else None
+    return ''
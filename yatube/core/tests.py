@@ -1,4 +1,38 @@
-from django.test import TestCase
+import gzip
+import multiprocessing
+import threading
+import time
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.templatetags.static import static
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image, features
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+
+from core import (
+    images, media_gc, stampede, staticfiles, thumbnail_engine, thumbnails)
+from core.cache import LocalTier, SQLiteCache, TieredCache
+from core.models import MediaBlob
+from core.storage import is_blob, media_storage
+from core.thumbnail_engine import Engine
+from posts.models import Post, User
+from yatube.settings import (
+    IMAGE_WEBP_WIDTHS, THUMBNAIL_SRCSET, THUMBNAIL_VARIANTS)
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
 class ViewTestClass(TestCase):
@@ -6,3 +40,668 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        image = BytesIO()
+        Image.new('RGB', (1200, 900), 'red').save(image, 'JPEG')
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Пост с картинкой',
+            image=SimpleUploadedFile('picture.jpg', image.getvalue()))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_request_shows_placeholder_without_resizing(self):
+        """Пока миниатюры нет, страница отдаёт заглушку и не ресайзит."""
+        with mock.patch.object(default.engine, 'create') as create:
+            response = self.client.get(reverse('posts:index'))
+        create.assert_not_called()
+        self.assertContains(response, 'thumbnail-placeholder.svg')
+
+    def test_generate_creates_every_variant(self):
+        """Фоновая генерация создаёт все варианты и обновляет ленты."""
+        self.client.get(reverse('posts:index'))
+        thumbnails.generate(self.post.image.name)
+        for alias in THUMBNAIL_VARIANTS:
+            with self.subTest(alias=alias):
+                self.assertIsNotNone(
+                    thumbnails.variant(self.post.image, alias))
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, 'thumbnail-placeholder.svg')
+        self.assertContains(
+            response, thumbnails.variant(self.post.image, 'post_feed').url)
+
+    def test_feed_image_is_responsive(self):
+        """Лента отдаёт srcset по ширинам, ленивую загрузку и заглушку."""
+        thumbnails.generate(self.post.image.name)
+        response = self.client.get(reverse('posts:index'))
+        found = thumbnails.responsive([self.post.image], 'post_feed')[
+            self.post.image.name]
+        widths, sizes = THUMBNAIL_SRCSET['post_feed']
+        for width in widths:
+            self.assertContains(response, f'{found.images[width].url} '
+                                          f'{width}w')
+        self.assertContains(response, f'sizes="{sizes}"')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertTrue(found.placeholder.startswith('data:image/jpeg'))
+        self.assertContains(response, found.placeholder)
+
+    def test_warm_thumbnails(self):
+        """warm_thumbnails догоняет варианты уже загруженных картинок."""
+        call_command('warm_thumbnails', stdout=StringIO())
+        self.assertIsNotNone(
+            thumbnails.variant(self.post.image, 'post_detail'))
+
+    def test_feed_page_looks_thumbnails_up_in_one_batch(self):
+        """Миниатюры страницы ленты ищутся одним запросом к базе."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Копия {number}',
+                 image=self.post.image.name)
+            for number in range(5))
+        Post.objects.create(author=self.user, text='Без картинки')
+        thumbnails.generate(self.post.image.name)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('posts:index'))
+        kvstore_queries = [
+            query for query in queries.captured_queries
+            if 'thumbnail_kvstore' in query['sql']]
+        self.assertEqual(len(kvstore_queries), 1)
+        found = thumbnails.variants([self.post.image, None], 'post_feed')
+        self.assertEqual(list(found), [self.post.image.name])
+        self.assertEqual(
+            found[self.post.image.name].url,
+            thumbnails.variant(self.post.image, 'post_feed').url)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailQueueTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='uploader')
+        image = BytesIO()
+        Image.new('RGB', (600, 400), 'green').save(image, 'JPEG')
+        self.content = image.getvalue()
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def post(self):
+        return Post.objects.create(
+            author=self.user, text='Из shell',
+            image=SimpleUploadedFile('shell.jpg', self.content))
+
+    def test_orm_save_schedules_thumbnails(self):
+        """Картинка, сохранённая мимо форм, получает миниатюры; правка
+        текста их не пересоздаёт."""
+        post = self.post()
+        self.assertIsNotNone(thumbnails.variant(post.image, 'post_feed'))
+        with mock.patch('core.thumbnails._submit') as submit:
+            post.text = 'Правка'
+            post.save()
+        submit.assert_not_called()
+
+    def test_worker_pool(self):
+        """С THUMBNAIL_WORKERS > 0 миниатюры создаёт поток пула."""
+        with mock.patch('core.thumbnails._submit'):
+            post = self.post()
+        threads = []
+
+        def ready(sender, **kwargs):
+            threads.append(threading.current_thread().name)
+        thumbnails.thumbnails_ready.connect(ready)
+        self.addCleanup(thumbnails.thumbnails_ready.disconnect, ready)
+        with mock.patch('core.thumbnails.THUMBNAIL_WORKERS', 2), \
+                mock.patch('core.thumbnails._executor', None):
+            future = thumbnails._submit(post.image.name)
+            try:
+                future.result(timeout=30)
+            finally:
+                thumbnails._executor.shutdown()
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith('thumbnails'))
+        self.assertIsNotNone(thumbnails.variant(post.image, 'post_feed'))
+
+
+class ThumbnailEngineTests(TestCase):
+    def image(self, size, image_format):
+        content = BytesIO()
+        Image.new('RGB', size, 'green').save(content, image_format)
+        content.seek(0)
+        return content
+
+    def test_jpeg_decoded_reduced(self):
+        """JPEG декодируется уменьшенным, миниатюра нужного размера."""
+        engine = Engine()
+        image = engine.get_image(self.image((4000, 3000), 'JPEG'))
+        options = {**ThumbnailBackend.default_options, 'crop': 'center'}
+        thumbnail = engine.create(image, (500, 400), options)
+        self.assertEqual(image.size, (2000, 1500))
+        self.assertEqual(thumbnail.size, (500, 400))
+
+    def test_pixel_cap(self):
+        """Слишком большие картинки не декодируются целиком."""
+        engine = Engine()
+        options = {**ThumbnailBackend.default_options, 'crop': 'center'}
+        with mock.patch.object(thumbnail_engine, 'THUMBNAIL_MAX_PIXELS',
+                               1000 * 1000):
+            with self.assertRaises(thumbnail_engine.ImageTooLarge):
+                engine.get_image(self.image((1200, 1000), 'PNG'))
+            image = engine.get_image(self.image((4000, 3000), 'JPEG'))
+            engine.create(image, (50, 40), options)
+            self.assertLessEqual(image.size[0] * image.size[1], 1000 * 1000)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageIngestTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='uploader')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def upload(self, size, image_format, mode='RGB', **save_options):
+        content = BytesIO()
+        Image.new(mode, size, 'red').save(
+            content, image_format, **save_options)
+        extension = image_format.lower()
+        return SimpleUploadedFile(f'upload.{extension}', content.getvalue())
+
+    def test_photo_normalized(self):
+        """Фото поворачивается по EXIF, уменьшается и теряет метаданные."""
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Phone'
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'Фото',
+            'image': self.upload((4000, 3000), 'JPEG', exif=exif),
+        })
+        post = Post.objects.get(text='Фото')
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (1920, 2560))
+            self.assertFalse(stored.getexif())
+        if not features.check('webp'):
+            return
+        for width in (None, *IMAGE_WEBP_WIDTHS):
+            with self.subTest(width=width):
+                self.assertTrue(post.image.storage.exists(
+                    images.webp_name(post.image.name, width)))
+
+    def test_transparent_image_kept_as_png(self):
+        """Картинка с прозрачностью остаётся PNG."""
+        self.client.post(reverse('users:profile_edit'), {
+            'bio': '', 'profile_pic': self.upload((10, 10), 'PNG', 'RGBA'),
+        })
+        self.user.profile.refresh_from_db()
+        self.assertTrue(self.user.profile.profile_pic.name.endswith('.png'))
+
+    def test_upload_size_limit(self):
+        """Слишком большой файл отклоняется формой."""
+        with mock.patch('core.images.IMAGE_UPLOAD_MAX_SIZE', 1024):
+            response = self.client.post(reverse('posts:post_create'), {
+                'text': 'Большой файл',
+                'image': self.upload((600, 600), 'BMP'),
+            })
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 1,0\xa0КБ.')
+        self.assertFalse(Post.objects.filter(text='Большой файл').exists())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class DedupStorageTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='reposter')
+        content = BytesIO()
+        Image.new('RGB', (40, 30), 'blue').save(content, 'PNG')
+        self.content = content.getvalue()
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def post(self):
+        return Post.objects.create(
+            author=self.user, text='Мем',
+            image=SimpleUploadedFile('meme.png', self.content))
+
+    def test_identical_uploads_share_file(self):
+        """Одинаковые загрузки — один файл, удаляется с последней ссылкой."""
+        first, second = self.post(), self.post()
+        name = first.image.name
+        self.assertTrue(is_blob(name))
+        self.assertEqual(second.image.name, name)
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 2)
+        first.delete()
+        self.assertTrue(media_storage.exists(name))
+        second.delete()
+        self.assertFalse(media_storage.exists(name))
+        self.assertFalse(MediaBlob.objects.filter(name=name).exists())
+
+    def test_replaced_image_released(self):
+        """Замена картинки снимает ссылку со старого файла."""
+        post = self.post()
+        name = post.image.name
+        other = BytesIO()
+        Image.new('RGB', (40, 30), 'green').save(other, 'PNG')
+        post.image = SimpleUploadedFile('other.png', other.getvalue())
+        post.save()
+        self.assertFalse(media_storage.exists(name))
+        self.assertTrue(media_storage.exists(post.image.name))
+
+    def test_dedupe_media(self):
+        """dedupe_media сводит старые копии к одному файлу по хешу."""
+        legacy = []
+        for name in ('posts/meme.png', 'posts/meme_copy.png'):
+            path = media_storage.path(name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file_:
+                file_.write(self.content)
+            Post.objects.create(author=self.user, text='Мем', image=name)
+            legacy.append(name)
+        call_command('dedupe_media', stdout=StringIO())
+        name, = set(Post.objects.values_list('image', flat=True))
+        self.assertTrue(is_blob(name))
+        self.assertTrue(media_storage.exists(name))
+        self.assertEqual(MediaBlob.objects.get(name=name).refcount, 2)
+        for name in legacy:
+            self.assertFalse(media_storage.exists(name))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaGarbageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='collector')
+        self.live = self.post('red')
+        thumbnails.generate(self.live.image.name)
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def post(self, color):
+        content = BytesIO()
+        Image.new('RGB', (600, 500), color).save(content, 'JPEG')
+        return Post.objects.create(
+            author=self.user, text=color,
+            image=SimpleUploadedFile('picture.jpg', content.getvalue()))
+
+    def write(self, name):
+        path = media_storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as file_:
+            file_.write(b'garbage')
+
+    def collect(self, *args):
+        output = StringIO()
+        call_command(
+            'collect_media_garbage', '--min-age', '0', *args, stdout=output)
+        return output.getvalue()
+
+    def thumbnail_names(self, name):
+        return [
+            image.name
+            for alias in THUMBNAIL_VARIANTS
+            for image in thumbnails.responsive(
+                [name], alias)[name].images.values()
+        ]
+
+    def live_files(self):
+        return [
+            self.live.image.name,
+            *self.thumbnail_names(self.live.image.name),
+        ]
+
+    def test_orphans_removed(self):
+        """Картинки без ссылок, их варианты и лишние миниатюры удаляются."""
+        orphans = ['posts/old.jpg', 'posts/old.jpg.480w.webp',
+                   'cache/00/00/orphan.jpg']
+        for name in orphans:
+            self.write(name)
+        dropped = self.post('blue')
+        thumbnails.generate(dropped.image.name)
+        dropped_files = [
+            dropped.image.name,
+            *(name for name in images.variant_names(dropped.image.name)
+              if media_storage.exists(name)),
+            *self.thumbnail_names(dropped.image.name),
+        ]
+        Post.objects.filter(pk=dropped.pk).update(image='')
+        self.assertIn(
+            f'Будет удалено файлов: {len(orphans + dropped_files)}',
+            self.collect('--dry-run'))
+        for name in orphans + dropped_files:
+            self.assertTrue(media_storage.exists(name))
+        self.collect()
+        for name in orphans + dropped_files:
+            with self.subTest(name=name):
+                self.assertFalse(media_storage.exists(name))
+        for name in self.live_files():
+            with self.subTest(name=name):
+                self.assertTrue(media_storage.exists(name))
+
+    def test_resumable(self):
+        """Обход останавливается после --max-batches и продолжается."""
+        self.write('posts/old.jpg')
+        output = self.collect('--batch-size', '1', '--max-batches', '1')
+        last = output.split('--start-after "')[1].rstrip('"\n')
+        self.collect('--start-after', last)
+        self.assertFalse(media_storage.exists('posts/old.jpg'))
+        for name in self.live_files():
+            self.assertTrue(media_storage.exists(name))
+
+    def test_reupload_during_collection_kept(self):
+        """Файл, загруженный снова посреди обхода, не удаляется."""
+        dropped = self.post('blue')
+        name = dropped.image.name
+        Post.objects.filter(pk=dropped.pk).update(image='')
+        files = [name, *(variant for variant in images.variant_names(name)
+                         if media_storage.exists(variant))]
+        old = time.time() - 7200
+        for path in files:
+            os.utime(media_storage.path(path), (old, old))
+        collected = media_gc.referenced
+
+        def reupload(names):
+            # Ссылка взята, строка поста ещё не зафиксирована.
+            if name in names:
+                media_storage.reference(name, media_storage.size(name))
+            return collected(names)
+
+        with mock.patch('core.media_gc.referenced', reupload):
+            media_gc.Collector(min_age=3600).collect_files()
+        for path in files:
+            self.assertTrue(media_storage.exists(path))
+        self.assertTrue(MediaBlob.objects.filter(name=name).exists())
+
+
+class StaticFilesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = tempfile.mkdtemp()
+        cls.static_root = override_settings(STATIC_ROOT=cls.root)
+        cls.static_root.enable()
+        cls.patches = [
+            mock.patch('core.staticfiles.STATIC_ROOT', cls.root),
+            mock.patch('core.staticfiles._hashed_names', None),
+        ]
+        for patch in cls.patches:
+            patch.start()
+        call_command('collectstatic', interactive=False, verbosity=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        for patch in cls.patches:
+            patch.stop()
+        cls.static_root.disable()
+        shutil.rmtree(cls.root, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_hashed_file_compressed_and_immutable(self):
+        """Хешированный файл отдаётся сжатым и с кешированием на год."""
+        url = static('css/bootstrap.min.css')
+        self.assertNotEqual(url, '/static/css/bootstrap.min.css')
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertIn(response['Content-Encoding'], ('gzip', 'br'))
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        if response['Content-Encoding'] == 'gzip':
+            with open(os.path.join(
+                    settings.BASE_DIR, 'static/css/bootstrap.min.css'),
+                    'rb') as original:
+                self.assertEqual(
+                    gzip.decompress(b''.join(response.streaming_content)),
+                    original.read())
+
+    @skipUnless(staticfiles.brotli, 'brotli не установлен')
+    def test_brotli_preferred(self):
+        """С пакетом brotli браузеру с br отдаётся копия .br."""
+        response = self.client.get(
+            static('css/bootstrap.min.css'), HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        with open(os.path.join(
+                settings.BASE_DIR, 'static/css/bootstrap.min.css'),
+                'rb') as original:
+            self.assertEqual(
+                staticfiles.brotli.decompress(
+                    b''.join(response.streaming_content)),
+                original.read())
+
+    def test_gzip_without_brotli(self):
+        """Без пакета brotli сжимается и отдаётся только gzip."""
+        encodings = [
+            encoding for encoding in staticfiles.ENCODINGS
+            if encoding[0] != 'br']
+        name = staticfiles_storage.stored_name('css/bootstrap.min.css')
+        with mock.patch('core.staticfiles.ENCODINGS', encodings):
+            staticfiles_storage.delete(name + '.br')
+            staticfiles_storage.compress(name)
+            response = self.client.get(
+                static('css/bootstrap.min.css'),
+                HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertFalse(staticfiles_storage.exists(name + '.br'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_plain_name_revalidated(self):
+        """Имя без хеша перепроверяется; без Accept-Encoding — как есть."""
+        response = self.client.get('/static/css/bootstrap.min.css')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('must-revalidate', response['Cache-Control'])
+        response = self.client.get(
+            '/static/css/bootstrap.min.css',
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+
+def increment(location, times):
+    backend = SQLiteCache(location, {})
+    for _ in range(times):
+        backend.incr('counter')
+
+
+class SQLiteCacheTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.backend()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def backend(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_values_and_expiry(self):
+        """Значения любого типа, add() и истечение срока."""
+        self.cache.set_many({'a': {'x': [1]}, 'b': True, 'c': 2})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c', 'd']),
+            {'a': {'x': [1]}, 'b': True, 'c': 2})
+        self.assertFalse(self.cache.add('a', 'new'))
+        self.cache.set('old', 1, timeout=0)
+        self.assertIsNone(self.cache.get('old'))
+        self.assertTrue(self.cache.add('old', 'new'))
+        self.assertEqual(self.cache.get('old'), 'new')
+        with self.assertRaises(ValueError):
+            self.cache.incr('a')
+
+    def test_shared_between_processes(self):
+        """incr() из нескольких процессов не теряет приращений."""
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=increment, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        self.assertEqual(self.backend().get('counter'), 200)
+
+    def test_lru_eviction_under_size_cap(self):
+        """При превышении MAX_SIZE вытесняются давно не читавшиеся."""
+        backend = self.backend(MAX_SIZE=10_000, CULL_FREQUENCY=4)
+        for number in range(8):
+            with mock.patch('time.time', return_value=number):
+                backend.set(f'key{number}', b'x' * 1000, timeout=None)
+        with mock.patch('time.time', return_value=10):
+            backend.get('key0')
+            for number in range(8, 12):
+                backend.set(f'key{number}', b'x' * 1000, timeout=None)
+        size, entries = backend.connection.execute(
+            'SELECT size, entries FROM cache_stats').fetchone()
+        self.assertLessEqual(size, 10_000)
+        self.assertEqual(entries, len(backend.get_many(
+            [f'key{number}' for number in range(12)])))
+        self.assertTrue(backend.has_key('key0'))
+        self.assertFalse(backend.has_key('key1'))
+        self.assertTrue(backend.has_key('key11'))
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tiered-tests',
+    },
+})
+class TieredCacheTests(TestCase):
+    def worker(self):
+        """TieredCache со своим L1, как в отдельном процессе."""
+        backend = TieredCache('shared', {})
+        backend.local = LocalTier(1024, 60, 60)
+        return backend
+
+    def setUp(self):
+        self.first, self.second = self.worker(), self.worker()
+        self.first.clear()
+
+    def test_hit_skips_shared_cache(self):
+        """Повторное чтение берётся из L1 без обращения к общему кешу."""
+        self.first.set('key', {'posts': [1, 2]})
+        self.first.get('key')
+        with mock.patch.object(
+                self.first.shared, 'get', side_effect=AssertionError):
+            self.assertEqual(self.first.get('key'), {'posts': [1, 2]})
+            self.assertEqual(
+                self.first.get_many(['key']), {'key': {'posts': [1, 2]}})
+
+    def test_invalidation_seen_after_check(self):
+        """Запись одного процесса другой видит при сверке с журналом."""
+        self.first.set('version', 1)
+        self.assertEqual(self.second.get('version'), 1)
+        self.first.incr('version')
+        self.first.set('other', 'value')
+        self.assertEqual(self.second.get('version'), 1)
+        self.second.local.checked = 0
+        self.assertEqual(self.second.get('version'), 2)
+        self.first.delete('version')
+        self.second.local.checked = 0
+        self.assertIsNone(self.second.get('version'))
+
+    def test_log_gap_clears_local_tier(self):
+        """Если журнал не покрывает пропуск, L1 очищается целиком."""
+        self.second.get_many(['a'])
+        self.first.set('a', 1)
+        self.assertEqual(self.second.get('a'), 1)
+        self.first.shared.set('a', 2)
+        self.first.shared.incr('tiered:generation')
+        self.second.local.checked = 0
+        self.assertEqual(self.second.get('a'), 2)
+
+    def test_lock_writes_not_logged(self):
+        """Поток блокировок не вытесняет из журнала точечные записи."""
+        self.first.set_many({'a': 1, 'b': 1})
+        self.assertEqual(self.second.get_many(['a', 'b']), {'a': 1, 'b': 1})
+        for number in range(self.first.local.change_log_size + 1):
+            self.first.add(f'page:{number}:lock', 'token', 30)
+            self.first.delete(f'page:{number}:lock')
+        self.first.set('a', 2)
+        self.second.local.checked = 0
+        shared = self.second.shared
+        with mock.patch.object(
+                shared, 'get_many', wraps=shared.get_many) as get_many:
+            self.assertEqual(
+                self.second.get_many(['a', 'b']), {'a': 2, 'b': 1})
+        # 'b' осталась в L1: сброшена только изменённая запись.
+        self.assertEqual(get_many.call_args.args[0], ['a'])
+
+    def test_byte_size_eviction(self):
+        """L1 вытесняет давно не читавшиеся записи сверх MAX_SIZE."""
+        tier = LocalTier(100, 60, 60)
+        tier.put('a', 'x' * 40)
+        tier.put('b', 'x' * 40)
+        tier.get('a')
+        tier.put('c', 'x' * 40)
+        self.assertEqual(list(tier.entries), ['a', 'c'])
+        self.assertLessEqual(tier.size, 100)
+
+
+class StampedeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self, value='свежее'):
+        self.calls += 1
+        time.sleep(0.1)
+        return value
+
+    def fetch_concurrently(self, version=None, requests=8):
+        results = []
+        barrier = threading.Barrier(requests)
+
+        def request():
+            barrier.wait()
+            results.append(stampede.fetch(
+                'feed', self.compute, 60, version))
+        threads = [threading.Thread(target=request) for _ in range(requests)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_single_recompute_when_empty(self):
+        """Без записи считает один запрос, остальные ждут его."""
+        self.assertEqual(self.fetch_concurrently(), ['свежее'] * 8)
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_served_during_recompute(self):
+        """Пока один пересчитывает новую версию, прочие отдают старую."""
+        stampede.store(
+            'feed', stampede.make_entry('старое', 60, version=1), 60)
+        results = self.fetch_concurrently(version=2)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(sorted(results), ['свежее'] + ['старое'] * 7)
+        self.assertEqual(stampede.fetch('feed', self.compute, 60, 2), 'свежее')
+
+    def test_early_refresh(self):
+        """Запись, долго пересчитываемая и близкая к сроку, обновляется
+        заранее, далёкая от срока — нет."""
+        near = stampede.make_entry('старое', 1, delta=60)
+        far = stampede.make_entry('старое', 3600, delta=0.01)
+        # Медиана сдвига вместо случайного: тест не должен мигать.
+        with mock.patch('core.stampede.random.random', return_value=0.5):
+            self.assertFalse(stampede.is_fresh(near))
+            self.assertTrue(stampede.is_fresh(far))
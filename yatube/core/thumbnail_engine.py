@@ -0,0 +1,77 @@
+"""PIL-движок sorl-thumbnail, который не декодирует лишние пиксели.
+
+JPEG декодируется сразу уменьшенным в 2, 4 или 8 раз (Image.draft()),
+остальные форматы перед финальным ресемплингом целочисленно сжимаются
+Image.reduce(). Оба шага оставляют запас REDUCING_GAP к размеру
+миниатюры, поэтому качество по-прежнему задаёт финальный ресемплинг.
+Картинки больше THUMBNAIL_MAX_PIXELS не декодируются целиком: JPEG
+уменьшается при декодировании, остальные отклоняются.
+"""
+import math
+
+from sorl.thumbnail.engines import pil_engine
+
+from yatube.settings import THUMBNAIL_MAX_PIXELS
+
+REDUCING_GAP = 2
+REDUCIBLE_MODES = ('L', 'LA', 'RGB', 'RGBA', 'CMYK', 'I', 'F')
+
+
+class ImageTooLarge(ValueError):
+    """Картинка больше THUMBNAIL_MAX_PIXELS даже после уменьшения."""
+
+
+class Engine(pil_engine.Engine):
+    def get_image(self, source):
+        image = super().get_image(source)
+        if image.format != 'JPEG':
+            self._check_pixels(image)
+        return image
+
+    def create(self, image, geometry, options):
+        if image.format == 'JPEG':
+            self.draft(image, geometry, options)
+        return super().create(image, geometry, options)
+
+    def draft(self, image, geometry, options):
+        """Выбирает для JPEG уменьшение при декодировании."""
+        if options.get('cropbox'):
+            # cropbox задан в координатах исходной картинки.
+            self._check_pixels(image)
+            return
+        width, height = image.size
+        scale = self._reducing_scale(image, geometry, options)
+        pixels = width * height
+        if pixels > THUMBNAIL_MAX_PIXELS:
+            # draft() сжимает не сильнее запрошенного, то есть результат
+            # до 2 раз больше запроса по каждой стороне.
+            scale = min(scale, math.sqrt(THUMBNAIL_MAX_PIXELS / pixels) / 2)
+        if scale < 1:
+            image.draft(image.mode, (
+                math.ceil(width * scale), math.ceil(height * scale)))
+        self._check_pixels(image)
+
+    def scale(self, image, geometry, options):
+        """Перед ресемплингом целочисленно сжимает большие картинки.
+
+        Вызывается после поворота по EXIF, так что reduce() не теряет
+        ориентацию.
+        """
+        scale = self._reducing_scale(image, geometry, options)
+        if scale <= 1 / 2 and image.mode in REDUCIBLE_MODES:
+            image = image.reduce(int(1 / scale))
+        return super().scale(image, geometry, options)
+
+    def _reducing_scale(self, image, geometry, options):
+        """Во сколько раз можно уменьшить картинку до ресемплинга."""
+        width, height = image.size
+        if self.flip_dimensions(image):
+            width, height = height, width
+        return self._calculate_scaling_factor(
+            width, height, geometry, options) * REDUCING_GAP
+
+    def _check_pixels(self, image):
+        width, height = image.size
+        if width * height > THUMBNAIL_MAX_PIXELS:
+            raise ImageTooLarge(
+                f'{width}x{height} больше {THUMBNAIL_MAX_PIXELS} пикселей')
@@ -0,0 +1,275 @@
+"""Миниатюры вне цикла запроса.
+
+Шаблоны не вызывают ресайз: {% thumbnail_variant %} только ищет готовые
+миниатюры в key-value store sorl-thumbnail. Все варианты из
+THUMBNAIL_VARIANTS в ширинах THUMBNAIL_SRCSET и крошечные заглушки
+для них создаёт пул фоновых потоков после фиксации транзакции, в
+которой сохранилась картинка; по готовности рассылается сигнал
+thumbnails_ready, чтобы закешированные страницы обновились.
+"""
+import base64
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from io import BytesIO
+
+from django.db import close_old_connections, transaction
+from django.dispatch import Signal
+from PIL import Image
+from sorl.thumbnail import default, delete as delete_thumbnails
+from sorl.thumbnail.base import ThumbnailBackend as BaseThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings, settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from yatube.settings import (
+    THUMBNAIL_PLACEHOLDER_WIDTH, THUMBNAIL_SRCSET, THUMBNAIL_VARIANTS,
+    THUMBNAIL_WORKERS)
+
+logger = logging.getLogger(__name__)
+
+thumbnails_ready = Signal()
+
+_executor = None
+
+
+class ThumbnailBackend(BaseThumbnailBackend):
+    """Бэкенд sorl-thumbnail, который умеет искать миниатюру без ресайза."""
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """ImageFile миниатюры с тем же именем, что даст get_thumbnail()."""
+        source = ImageFile(file_)
+        if settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def lookup(self, file_, geometry_string, **options):
+        """Готовая миниатюра из key-value store или None."""
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, **options))
+
+
+class Responsive:
+    """Готовые миниатюры картинки по ширинам: src, srcset и заглушка."""
+
+    def __init__(self, images, width, sizes, placeholder=None):
+        self.images = images
+        self.default = images[width]
+        self.sizes = sizes
+        self.placeholder = placeholder
+
+    @property
+    def url(self):
+        return self.default.url
+
+    @property
+    def name(self):
+        return self.default.name
+
+    @property
+    def width(self):
+        return self.default.width
+
+    @property
+    def height(self):
+        return self.default.height
+
+    @property
+    def srcset(self):
+        # Ширина берётся фактическая: без растягивания крупные варианты
+        # маленькой картинки совпадают, и такие повторы не нужны.
+        by_width = {}
+        for image in self.images.values():
+            by_width.setdefault(image.width, image)
+        return ', '.join(
+            f'{image.url} {width}w'
+            for width, image in sorted(by_width.items()))
+
+
+def geometries(alias):
+    """{ширина: (геометрия, опции)} всех ширин варианта alias."""
+    geometry, options = THUMBNAIL_VARIANTS[alias]
+    width, height = map(int, geometry.split('x'))
+    widths, _ = THUMBNAIL_SRCSET.get(alias, ((), None))
+    result = {}
+    for size in sorted({width, *widths}):
+        size_options = options
+        if size > width:
+            # Крупнее базовой — только если источник позволяет.
+            size_options = {**options, 'upscale': False}
+        result[size] = (
+            f'{size}x{round(height * size / width)}', size_options)
+    return result
+
+
+def base_width(alias):
+    return int(THUMBNAIL_VARIANTS[alias][0].split('x')[0])
+
+
+def _thumbnail_key(name, geometry, options):
+    return add_prefix(default.backend.thumbnail_file(
+        name, geometry, **options).key)
+
+
+def placeholder_key(name, alias):
+    """Ключ заглушки: рядом с базовой миниатюрой варианта."""
+    geometry, options = THUMBNAIL_VARIANTS[alias]
+    return add_prefix(default.backend.thumbnail_file(
+        name, geometry, **options).key, 'placeholder')
+
+
+def _fetch(keys):
+    """{ключ: сырое значение или None} из key-value store sorl.
+
+    С cached_db key-value store это один cache.get_many() и, для
+    промахов кеша, один запрос к таблице sorl; с другими хранилищами —
+    поштучные обращения.
+    """
+    kvstore = default.kvstore
+    if not isinstance(kvstore, CachedDBKVStore):
+        return {key: kvstore._get_raw(key) for key in keys}
+    values = kvstore.cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    if missing:
+        rows = dict(KVStoreModel.objects.filter(
+            key__in=missing).values_list('key', 'value'))
+        found = {key: rows.get(key, EMPTY_VALUE) for key in missing}
+        kvstore.cache.set_many(found, settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(found)
+    return {
+        key: None if values[key] == EMPTY_VALUE else values[key]
+        for key in keys
+    }
+
+
+def responsive(files, alias):
+    """{имя картинки: Responsive или None} для набора картинок.
+
+    None — пока не готова базовая миниатюра варианта.
+    """
+    names = {str(file_) for file_ in files if file_}
+    keys = {}
+    for name in names:
+        for width, (geometry, options) in geometries(alias).items():
+            keys[_thumbnail_key(name, geometry, options)] = (name, width)
+        keys[placeholder_key(name, alias)] = (name, None)
+    values = _fetch(list(keys))
+    images = {name: {} for name in names}
+    placeholders = {}
+    for key, (name, width) in keys.items():
+        if values[key] is None:
+            continue
+        if width is None:
+            placeholders[name] = values[key]
+        else:
+            images[name][width] = deserialize_image_file(values[key])
+    width = base_width(alias)
+    _, sizes = THUMBNAIL_SRCSET.get(alias, ((), '100vw'))
+    return {
+        name: Responsive(
+            images[name], width, sizes, placeholders.get(name))
+        if width in images[name] else None
+        for name in names
+    }
+
+
+def variant(file_, alias):
+    """Готовая базовая миниатюра варианта alias или None."""
+    geometry, options = THUMBNAIL_VARIANTS[alias]
+    # Ключ sorl зависит от хранилища источника; generate() работает с
+    # именами в хранилище по умолчанию, поэтому и поиск идёт по имени.
+    return default.backend.lookup(str(file_), geometry, **options)
+
+
+def variants(files, alias):
+    """{имя картинки: готовая базовая миниатюра или None}."""
+    return {
+        name: found and found.default
+        for name, found in responsive(files, alias).items()
+    }
+
+
+def missing(name):
+    """Есть ли у картинки name не созданные миниатюры или заглушки."""
+    keys = [placeholder_key(name, alias) for alias in THUMBNAIL_VARIANTS]
+    for alias in THUMBNAIL_VARIANTS:
+        keys.extend(
+            _thumbnail_key(name, geometry, options)
+            for geometry, options in geometries(alias).values())
+    return not all(_fetch(keys).values())
+
+
+def _placeholder(thumbnail):
+    """Крошечная копия миниатюры как data: URI."""
+    with thumbnail.storage.open(thumbnail.name) as file_:
+        image = Image.open(file_)
+        image.draft('RGB', (THUMBNAIL_PLACEHOLDER_WIDTH,) * 2)
+        image = image.convert('RGB')
+        image.thumbnail((THUMBNAIL_PLACEHOLDER_WIDTH,) * 2)
+    output = BytesIO()
+    image.save(output, 'JPEG', quality=40)
+    data = base64.b64encode(output.getvalue()).decode()
+    return f'data:image/jpeg;base64,{data}'
+
+
+def generate(name):
+    """Создаёт все миниатюры и заглушки картинки name."""
+    kvstore = default.kvstore
+    for alias in THUMBNAIL_VARIANTS:
+        for width, (geometry, options) in geometries(alias).items():
+            thumbnail = default.backend.get_thumbnail(
+                name, geometry, **options)
+            if width == base_width(alias):
+                kvstore._set_raw(
+                    placeholder_key(name, alias), _placeholder(thumbnail))
+    thumbnails_ready.send(sender=ThumbnailBackend, name=name)
+
+
+def forget(name):
+    """Удаляет миниатюры картинки name, их записи и заглушки."""
+    default.kvstore._delete_raw(*(
+        placeholder_key(name, alias) for alias in THUMBNAIL_VARIANTS))
+    delete_thumbnails(name, delete_file=False)
+
+
+def _generate_logged(name):
+    # Сбой миниатюр не должен ронять сохранение поста.
+    try:
+        generate(name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры %s', name)
+
+
+def _run(name):
+    try:
+        _generate_logged(name)
+    finally:
+        close_old_connections()
+
+
+def _submit(name):
+    """Future задачи в пуле или None, если миниатюры уже созданы."""
+    global _executor
+    if not THUMBNAIL_WORKERS:
+        _generate_logged(name)
+        return None
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            THUMBNAIL_WORKERS, thread_name_prefix='thumbnails')
+    return _executor.submit(_run, name)
+
+
+def schedule(image):
+    """Ставит создание миниатюр в очередь после фиксации транзакции."""
+    if image:
+        transaction.on_commit(partial(_submit, image.name))
@@ -1,9 +1,29 @@
 from django.contrib import admin
 
+from . import search
 from .models import Post, Group, Comment, Follow
+from .pagination import CachedCountPaginator
 
 
-class PostAdmin(admin.ModelAdmin):
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список без COUNT(*) по всей таблице на каждое открытие.
+
+    Число строк кешируется (или оценивается) CachedCountPaginator
+    до записи в count_dependencies, а счётчик «всего N» без учёта
+    фильтров не выводится.
+    """
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+    count_dependencies = ()
+
+    def get_paginator(self, request, queryset, per_page, orphans=0,
+                      allow_empty_first_page=True):
+        return self.paginator(
+            queryset, per_page, orphans, allow_empty_first_page,
+            dependencies=self.count_dependencies)
+
+
+class PostAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'text',
@@ -11,33 +31,51 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group',
     )
-    list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
+    # Фильтр по дате даёт готовые диапазоны, без выборки значений.
     list_filter = ('pub_date',)
+    # Ссылки строит {% indexed_date_hierarchy %} по MIN/MAX, а фильтры
+    # по периоду — диапазоны по индексу post_pub_date_idx.
+    date_hierarchy = 'pub_date'
+    ordering = ('-pub_date', '-pk')
     empty_value_display = '-пусто-'
+    count_dependencies = ('posts',)
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по инвертированному индексу вместо LIKE '%...%'."""
+        if not search_term:
+            return queryset, False
+        found = search.search(search_term).values('pk')
+        return queryset.filter(pk__in=found), False
 
 
-class GroupAdmin(admin.ModelAdmin):
+class GroupAdmin(LargeTableAdmin):
     list_display = (
         "pk",
         "title",
         "description",
     )
-    search_fields = ("text",)
-    list_filter = ("title",)
+    search_fields = ("title",)
     empty_value_display = "-пусто-"
+    count_dependencies = ('groups',)
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = ('pk', 'user', 'author')
-    list_filter = ('author',)
-    search_fields = ('author', 'created')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    search_fields = ('=user__username', '=author__username')
+    count_dependencies = ('follows',)
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = ('pk', 'post', 'author', 'text', 'created')
-    list_filter = ('author',)
-    search_fields = ('author', 'user')
+    list_select_related = ('post', 'author')
+    autocomplete_fields = ('post', 'author')
+    search_fields = ('=author__username', 'text')
+    count_dependencies = ('comments',)
 
 
 admin.site.register(Post, PostAdmin)
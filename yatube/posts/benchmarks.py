@@ -0,0 +1,90 @@
+"""Общие помощники для команд-бенчмарков."""
+import random
+import time
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+from users.models import Profile
+from .models import Comment, Follow, Group, Post, User
+
+SEED_BATCH_SIZE = 5000
+
+
+def measure(func, repeat=5, using=DEFAULT_DB_ALIAS):
+    """Лучшее время вызова func и число запросов в одном вызове."""
+    best = None
+    queries = 0
+    for _ in range(repeat):
+        with CaptureQueriesContext(connections[using]) as captured:
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+        queries = len(captured)
+        best = elapsed if best is None else min(best, elapsed)
+    return best, queries
+
+
+def seed(authors, readers, posts_per_author, follows_per_reader,
+         groups=0, prefix='bench', using=DEFAULT_DB_ALIAS):
+    """Заполняет базу синтетическими авторами, читателями и постами.
+
+    Посты создаются через bulk_create, поэтому сигналы не срабатывают:
+    производные структуры (ленты, счётчики) пересобираются отдельно.
+    """
+    users = User.objects.using(using)
+    group_objects = Group.objects.using(using)
+    users.bulk_create(
+        User(username=f'{prefix}_author_{i}') for i in range(authors))
+    users.bulk_create(
+        User(username=f'{prefix}_reader_{i}') for i in range(readers))
+    # bulk_create не шлёт post_save, профили создаются явно.
+    _bulk_create(Profile, using, (
+        Profile(user_id=user_id) for user_id in users.filter(
+            username__startswith=f'{prefix}_', profile__isnull=True
+        ).values_list('pk', flat=True)))
+    author_ids = list(users.filter(
+        username__startswith=f'{prefix}_author_'
+    ).values_list('pk', flat=True))
+    reader_ids = list(users.filter(
+        username__startswith=f'{prefix}_reader_'
+    ).values_list('pk', flat=True))
+    group_objects.bulk_create(
+        Group(title=f'{prefix} {i}', slug=f'{prefix}-{i}', description='')
+        for i in range(groups))
+    group_ids = list(group_objects.filter(
+        slug__startswith=f'{prefix}-').values_list('pk', flat=True))
+    posts = (
+        Post(author_id=author_id, text=f'{prefix} post {i}',
+             group_id=group_ids[(i + author_id) % len(group_ids)]
+             if group_ids else None)
+        for i in range(posts_per_author) for author_id in author_ids
+    )
+    _bulk_create(Post, using, posts)
+    follows = (
+        Follow(user_id=reader_id, author_id=author_id)
+        for reader_id in reader_ids
+        for author_id in random.sample(
+            author_ids, min(follows_per_reader, len(author_ids)))
+    )
+    _bulk_create(Follow, using, follows)
+    return reader_ids
+
+
+def seed_comments(post_ids, per_post, author_id, using=DEFAULT_DB_ALIAS):
+    """По per_post комментариев к каждому из постов post_ids."""
+    _bulk_create(Comment, using, (
+        Comment(post_id=post_id, author_id=author_id, text=f'comment {i}')
+        for post_id in post_ids for i in range(per_post)
+    ))
+
+
+def _bulk_create(model, using, objects):
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) >= SEED_BATCH_SIZE:
+            model.objects.using(using).bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.using(using).bulk_create(batch)
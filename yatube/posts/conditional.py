@@ -0,0 +1,36 @@
+"""Условные GET для лент и страниц постов.
+
+ETag считается без запросов к базе: из поколений зависимостей страницы
+(core.dependencies), которые повышает запись в базу, из адреса
+с параметрами и из cookie сессии и CSRF — от них зависят
+шапка, кнопки автора и токены в формах. Совпавший If-None-Match
+получает 304 до выборок и шаблонов.
+"""
+import hashlib
+
+from django.conf import settings
+from django.views.decorators.http import condition
+
+from core import dependencies
+
+# Имена пользователей и профили видны на всех страницах.
+USER_DEPENDENCIES = ('authors', 'profiles')
+
+
+def conditional_page(*names):
+    """condition() с ETag по зависимостям names и USER_DEPENDENCIES.
+
+    В names подставляются аргументы представления из адреса:
+    'comments:post:{post_id}'.
+    """
+    def page_etag(request, *args, **kwargs):
+        parts = (
+            dependencies.version(
+                *(name.format(**kwargs) for name in names),
+                *USER_DEPENDENCIES),
+            request.get_full_path(),
+            request.COOKIES.get(settings.SESSION_COOKIE_NAME, ''),
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+        )
+        return hashlib.md5('\n'.join(parts).encode()).hexdigest()
+    return condition(etag_func=page_etag)
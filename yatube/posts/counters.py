@@ -0,0 +1,67 @@
+"""Денормализованные счётчики постов, подписок и комментариев.
+
+Счётчики меняются атомарно выражениями F() из сигналов post_save и
+post_delete (posts.signals), то есть при любой записи через ORM, и не
+опускаются ниже нуля. Расхождения (bulk-операции, правки в обход ORM)
+исправляет reconcile() и команда reconcile_counters.
+"""
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from users.models import Profile
+from .models import Comment, Follow, Post
+
+
+def _shifted(field, delta):
+    return Greatest(F(field) + delta, 0)
+
+
+def change_posts_count(user_id, delta):
+    Profile.objects.filter(user_id=user_id).update(
+        posts_count=_shifted('posts_count', delta))
+
+
+def change_follow_counts(user_id, author_id, delta):
+    Profile.objects.filter(user_id=user_id).update(
+        following_count=_shifted('following_count', delta))
+    Profile.objects.filter(user_id=author_id).update(
+        followers_count=_shifted('followers_count', delta))
+
+
+def change_comments_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=_shifted('comments_count', delta))
+
+
+def _count(queryset, field, outer='user'):
+    """Коррелированный подзапрос COUNT(*) по полю field."""
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef(outer)}).order_by().values(
+            field).annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+COUNTERS = (
+    (Profile, 'posts_count', _count(Post.objects, 'author')),
+    (Profile, 'followers_count', _count(Follow.objects, 'author')),
+    (Profile, 'following_count', _count(Follow.objects, 'user')),
+    (Post, 'comments_count', _count(Comment.objects, 'post', outer='pk')),
+)
+
+
+def reconcile(fix=True, using=DEFAULT_DB_ALIAS):
+    """Сверяет счётчики с фактическими COUNT(*) в базе using.
+
+    Возвращает {(модель, поле): число разошедшихся строк}; при fix=True
+    исправляет их одним UPDATE на счётчик.
+    """
+    drift = {}
+    for model, field, actual in COUNTERS:
+        rows = model.objects.using(using)
+        stale = rows.annotate(actual=actual).exclude(**{field: F('actual')})
+        drift[model.__name__, field] = stale.count()
+        if fix and drift[model.__name__, field]:
+            rows.filter(pk__in=stale.values('pk')).update(**{field: actual})
+    return drift
@@ -0,0 +1,63 @@
+"""Зависимости закешированных лент.
+
+Фрагменты лент, страницы для гостей, их ETag и кеш числа постов
+паджинатора устаревают по зависимостям (core.dependencies) от наборов и
+строк, которые на них видны. Какие зависимости затрагивает запись каждой
+модели, описывают функции *_dependencies ниже; их подключает
+posts.signals.
+"""
+from core.dependencies import depend
+from yatube.settings import FEED_CACHE_TIMEOUT
+
+
+def context(request, *dependencies):
+    """Переменные шаблона для {% cache %} фрагментов ленты.
+
+    dependencies — то, что видно на странице; они же отмечаются для
+    кеша страниц гостей.
+    """
+    return {
+        'feed_version': depend(request, *dependencies),
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT,
+    }
+
+
+def post_dependencies(post):
+    names = [
+        'posts', f'post:{post.pk}', f'posts:author:{post.author_id}',
+        # Число постов автора.
+        f'profile:{post.author_id}',
+    ]
+    if post.group_id:
+        names.append(f'posts:group:{post.group_id}')
+    return names
+
+
+def comment_dependencies(comment):
+    # 'comments' — число строк в админке.
+    return ['comments', f'comments:post:{comment.post_id}']
+
+
+def follow_dependencies(follow):
+    """Число подписчиков и подписок видно в обоих профилях."""
+    # 'follows' — число строк в админке и ETag профиля, где автор
+    # известен только по имени.
+    return [
+        'follows', f'profile:{follow.user_id}', f'profile:{follow.author_id}',
+    ]
+
+
+def group_dependencies(group):
+    # Название группы есть у постов в общей ленте.
+    return ['groups', f'group:{group.pk}']
+
+
+def profile_dependencies(profile):
+    # 'profiles' входит в ETag страниц (posts.conditional).
+    return ['profiles', f'profile:{profile.user_id}']
+
+
+def user_dependencies(user):
+    # Имена авторов есть во всех лентах и в комментариях; 'users' —
+    # число строк в админке.
+    return ['authors', 'users', f'profile:{user.pk}']
@@ -0,0 +1,31 @@
+from django.core.exceptions import ImproperlyConfigured
+
+from yatube.settings import FOLLOW_FEED_ENGINE
+from .models import Post
+from .recent_posts import MergedFeed
+
+
+def follow_feed(user, engine=None, queryset=None):
+    """Посты авторов, на которых подписан пользователь.
+
+    engine (по умолчанию FOLLOW_FEED_ENGINE):
+    'timeline' — чтение материализованной ленты TimelineEntry,
+    'join' — соединение Follow и Post на каждый запрос,
+    'merge' — слияние кешированных буферов последних постов авторов
+    (возвращает MergedFeed, а не QuerySet).
+    queryset — базовая выборка постов (например, с select_related).
+    """
+    engine = engine or FOLLOW_FEED_ENGINE
+    if queryset is None:
+        queryset = Post.objects.all()
+    if engine == 'timeline':
+        # Сортировка по полям TimelineEntry: диапазон по индексу ленты
+        # без временной сортировки.
+        return queryset.filter(timeline_entries__user=user).order_by(
+            '-timeline_entries__pub_date', '-pk')
+    if engine == 'join':
+        return queryset.filter(author__following__user=user)
+    if engine == 'merge':
+        return MergedFeed(user, queryset)
+    raise ImproperlyConfigured(
+        f'Неизвестный движок ленты подписок: {engine!r}')
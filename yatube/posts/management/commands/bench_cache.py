@@ -0,0 +1,96 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'sqlite': 'core.cache.SQLiteCache',
+}
+# Значение размером с закешированный фрагмент ленты.
+VALUE = 'x' * 4096
+BATCH = 20
+
+
+def make_backend(name, directory):
+    location = {
+        'locmem': f'bench-{os.getpid()}',
+        'file': os.path.join(directory, 'file'),
+        'sqlite': os.path.join(directory, 'cache.sqlite3'),
+    }[name]
+    return import_string(BACKENDS[name])(
+        location, {'OPTIONS': {'MAX_ENTRIES': 100_000}})
+
+
+def cases(backend, keys):
+    batches = [keys[start:start + BATCH]
+               for start in range(0, len(keys), BATCH)]
+    backend.set('counter', 0)
+    return {
+        'set': lambda: [backend.set(key, VALUE) for key in keys],
+        'get': lambda: [backend.get(key) for key in keys],
+        'set_many': lambda: [
+            backend.set_many(dict.fromkeys(batch, VALUE))
+            for batch in batches],
+        'get_many': lambda: [backend.get_many(batch) for batch in batches],
+        'incr': lambda: [backend.incr('counter') for _ in keys],
+    }
+
+
+def increment(name, directory, times):
+    backend = make_backend(name, directory)
+    for _ in range(times):
+        try:
+            backend.incr('shared')
+        except ValueError:
+            # Процесс не видит ключ, заведённый родителем (locmem).
+            return
+
+
+class Command(BaseCommand):
+    help = ('Микробенчмарк бэкендов кеша: мкс на операцию и проверка '
+            'общего счётчика из нескольких процессов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backends', nargs='+', choices=BACKENDS,
+                            default=list(BACKENDS))
+        parser.add_argument('--keys', type=int, default=1000)
+        parser.add_argument('--processes', type=int, default=4)
+
+    def handle(self, *args, **options):
+        keys = [f'bench:{number}' for number in range(options['keys'])]
+        for name in options['backends']:
+            with tempfile.TemporaryDirectory() as directory:
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                backend = make_backend(name, directory)
+                for operation, run in cases(backend, keys).items():
+                    started = time.perf_counter()
+                    run()
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(
+                        f'{operation:>10}: '
+                        f'{elapsed / len(keys) * 1e6:8.1f} мкс/ключ')
+                shared = self.shared(
+                    name, directory, backend, options['processes'],
+                    len(keys))
+                self.stdout.write(f'{"processes":>10}: {shared}')
+
+    def shared(self, name, directory, backend, processes, times):
+        """Итог incr() общего ключа из processes процессов."""
+        backend.set('shared', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(
+                target=increment, args=(name, directory, times))
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        result = make_backend(name, directory).get('shared')
+        return f'{result} из {processes * times}'
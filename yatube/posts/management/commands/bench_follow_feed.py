@@ -0,0 +1,64 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+
+from posts import counters, timeline
+from posts.benchmarks import measure, seed
+from posts.feeds import follow_feed
+from posts.models import Follow, Post, User
+from yatube.settings import POSTS_PER_PAGE
+
+ENGINES = ('join', 'timeline', 'merge')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает движки ленты подписок на одних и тех же данных. '
+            'По умолчанию — в отдельной базе bench.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='bench',
+                            help='Псевдоним базы для замеров.')
+        parser.add_argument('--seed', action='store_true',
+                            help='Сначала заполнить базу тестовыми данными.')
+        parser.add_argument('--authors', type=int, default=2000)
+        parser.add_argument('--readers', type=int, default=20)
+        parser.add_argument('--posts-per-author', type=int, default=50)
+        parser.add_argument('--follows', type=int, default=1000,
+                            help='Подписок у каждого читателя.')
+        parser.add_argument('--pages', type=int, nargs='+',
+                            default=[1, 10, 100])
+        parser.add_argument('--engines', nargs='+', choices=ENGINES,
+                            default=list(ENGINES))
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        using = options['database']
+        call_command('migrate', database=using, verbosity=0)
+        if options['seed']:
+            seed(options['authors'], options['readers'],
+                 options['posts_per_author'], options['follows'],
+                 using=using)
+            timeline.rebuild(using=using)
+            counters.reconcile(using=using)
+        follows = Follow.objects.using(using)
+        reader_ids = follows.values_list('user_id', flat=True).distinct()
+        reader = User.objects.using(using).filter(pk__in=reader_ids).first()
+        if reader is None:
+            self.stderr.write('Нет подписок: запустите с --seed.')
+            return
+        self.stdout.write(f'Читатель: {reader}, подписок: '
+                          f'{follows.filter(user=reader).count()}')
+        posts = Post.objects.using(using)
+        # Буферы движка 'merge' прогреваются первым повтором:
+        # в таблице лучшее время, то есть тёплый кеш.
+        for engine in options['engines']:
+            for number in options['pages']:
+                def render_page():
+                    paginator = Paginator(
+                        follow_feed(reader, engine, posts), POSTS_PER_PAGE)
+                    list(paginator.get_page(number))
+                best, queries = measure(
+                    render_page, options['repeat'], using=using)
+                self.stdout.write(
+                    f'{engine:>10} стр. {number:>5}: '
+                    f'{best * 1000:8.2f} мс, запросов: {queries}')
@@ -0,0 +1,114 @@
+import json
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.benchmarks import measure, seed, seed_comments
+from posts.models import Comment, Follow, Group, Post, User
+from yatube.settings import POSTS_PER_PAGE
+
+INDEXED_MODELS = (Post, Comment, Follow)
+
+
+class Command(BaseCommand):
+    help = ('Замеряет планы и время горячих запросов лент без составных '
+            'индексов и с ними. По умолчанию — в отдельной базе bench: '
+            'индексы на время замера удаляются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='bench',
+                            help='Псевдоним базы для замеров.')
+        parser.add_argument('--seed', action='store_true',
+                            help='Сначала заполнить базу тестовыми данными.')
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--authors', type=int, default=10_000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--comments', type=int, default=1000,
+                            help='Комментариев к самому новому посту.')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--json', help='Куда сохранить отчёт.')
+
+    def handle(self, *args, **options):
+        self.using = options['database']
+        call_command('migrate', database=self.using, verbosity=0)
+        if options['seed']:
+            self.stdout.write('Заполнение базы...')
+            posts_per_author = max(options['posts'] // options['authors'], 1)
+            seed(options['authors'], readers=100,
+                 posts_per_author=posts_per_author,
+                 follows_per_reader=100, groups=options['groups'],
+                 using=self.using)
+            seed_comments(
+                Post.objects.using(self.using).order_by(
+                    '-pub_date', '-id').values_list('pk', flat=True)[:1],
+                options['comments'],
+                User.objects.using(self.using).values_list(
+                    'pk', flat=True).first(),
+                using=self.using)
+        queries = self.queries()
+        if not queries:
+            self.stderr.write('Нет данных: запустите с --seed.')
+            return
+        report = {}
+        try:
+            for phase, create in (('before', False), ('after', True)):
+                self.set_indexes(create)
+                report[phase] = {}
+                self.stdout.write(self.style.MIGRATE_HEADING(phase))
+                for name, queryset in queries.items():
+                    best, _ = measure(lambda: list(queryset.all()),
+                                      options['repeat'], using=self.using)
+                    plan = queryset.explain()
+                    report[phase][name] = {'ms': best * 1000, 'plan': plan}
+                    self.stdout.write(f'{name:>18}: {best * 1000:9.2f} мс')
+                    for line in plan.splitlines():
+                        self.stdout.write(f'{"":>20}{line}')
+        finally:
+            # Прерванный замер не оставляет базу без индексов.
+            self.set_indexes(True)
+        if options['json']:
+            with open(options['json'], 'w') as output:
+                json.dump(report, output, ensure_ascii=False, indent=2)
+
+    def queries(self):
+        posts = Post.objects.using(self.using)
+        comments = Comment.objects.using(self.using)
+        follows = Follow.objects.using(self.using)
+        comment = comments.select_related('post').first()
+        group = Group.objects.using(self.using).first()
+        follow = follows.first()
+        if comment is None or group is None or follow is None:
+            return {}
+        post = comment.post
+        page = slice(0, POSTS_PER_PAGE)
+        return {
+            'index': posts.order_by('-pub_date', '-id')[page],
+            'group_list': posts.filter(
+                group=group).order_by('-pub_date', '-id')[page],
+            'profile': posts.filter(
+                author=post.author_id).order_by('-pub_date', '-id')[page],
+            'comments': comments.filter(
+                post=post).order_by('created', 'id')[page],
+            'is_following': follows.filter(
+                user=follow.user_id, author=follow.author_id),
+            'followers': follows.filter(
+                author=follow.author_id).values('user')[page],
+        }
+
+    def set_indexes(self, create):
+        """Создаёт или удаляет составные индексы из Meta.indexes."""
+        connection = connections[self.using]
+        with connection.cursor() as cursor:
+            existing = {
+                model: set(connection.introspection.get_constraints(
+                    cursor, model._meta.db_table))
+                for model in INDEXED_MODELS
+            }
+        with connection.schema_editor() as editor:
+            for model in INDEXED_MODELS:
+                for index in model._meta.indexes:
+                    if create and index.name not in existing[model]:
+                        editor.add_index(model, index)
+                    elif not create and index.name in existing[model]:
+                        editor.remove_index(model, index)
@@ -0,0 +1,79 @@
+import multiprocessing
+import time
+import uuid
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+
+from core import stampede
+
+MODES = ('plain', 'protected')
+
+
+def recompute(render, running, peak, total):
+    """Имитация выборки Post и рендера ленты с учётом конкуренции."""
+    with running.get_lock():
+        running.value += 1
+        total.value += 1
+        peak.value = max(peak.value, running.value)
+    time.sleep(render)
+    with running.get_lock():
+        running.value -= 1
+    return 'лента'
+
+
+def request(mode, key, version, render, counters, barrier):
+    """Запрос воркера к устаревшей ленте."""
+    def compute():
+        return recompute(render, *counters)
+
+    barrier.wait()
+    if mode == 'protected':
+        stampede.fetch(key, compute, 60, version)
+        return
+    value = cache.get(key)
+    if value is None:
+        cache.set(key, compute(), 60)
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный сценарий: устаревшую ленту одновременно '
+            'запрашивают N процессов; считает пересчёты без защиты и с '
+            'core.stampede.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=32)
+        parser.add_argument('--render-ms', type=int, default=200)
+        parser.add_argument('--modes', nargs='+', choices=MODES,
+                            default=list(MODES))
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        render = options['render_ms'] / 1000
+        for mode in options['modes']:
+            key = f'bench-stampede:{uuid.uuid4().hex}'
+            if mode == 'protected':
+                # Запись прошлой версии ленты. Без защиты версия входит
+                # в ключ, и после записи в ленты ключа просто нет.
+                stampede.store(
+                    key, stampede.make_entry('старая лента', 60, 1), 60)
+            counters = [context.Value('i', 0) for _ in range(3)]
+            barrier = context.Barrier(options['requests'])
+            workers = [
+                context.Process(target=request, args=(
+                    mode, key, 2, render, counters, barrier))
+                for _ in range(options['requests'])
+            ]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+                if worker.exitcode:
+                    raise CommandError(f'Запрос в режиме {mode} упал.')
+            elapsed = time.perf_counter() - started
+            cache.delete_many([key, f'{key}:lock'])
+            _, peak, total = counters
+            self.stdout.write(
+                f'{mode:>10}: пересчётов {total.value}, одновременно до '
+                f'{peak.value}, {elapsed * 1000:.0f} мс')
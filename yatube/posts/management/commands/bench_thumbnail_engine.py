@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+from PIL import Image
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.parsers import parse_geometry
+
+from yatube.settings import THUMBNAIL_VARIANTS
+
+ENGINES = {
+    'sorl': 'sorl.thumbnail.engines.pil_engine.Engine',
+    'draft': 'core.thumbnail_engine.Engine',
+}
+# Синтетические снимки: 20 Мп JPEG с телефона и большой PNG.
+SAMPLES = {
+    'photo.jpg': ((5472, 3648), 'JPEG'),
+    'screen.png': ((3840, 2160), 'PNG'),
+}
+
+
+def make_thumbnail(engine, data, geometry_string, options):
+    image = engine.get_image(BytesIO(data))
+    geometry = parse_geometry(
+        geometry_string, engine.get_image_ratio(image, options))
+    thumbnail = engine.create(image, geometry, options)
+    return engine._get_raw_data(
+        thumbnail, options['format'], options['quality'], image_info={})
+
+
+def run_case(engine_path, path, geometry, options, repeat, results):
+    """Замер в отдельном процессе: его пик RSS не смешан с другими."""
+    engine = import_string(engine_path)()
+    with open(path, 'rb') as source:
+        data = source.read()
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        make_thumbnail(engine, data, geometry, options)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    results.put((best, peak))
+
+
+class Command(BaseCommand):
+    help = ('Микробенчмарк движков миниатюр: время и прирост пикового '
+            'RSS на одну миниатюру.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'images', nargs='*',
+            help='Свои картинки (по умолчанию — синтетические 20 Мп).')
+        parser.add_argument('--engines', nargs='+', choices=ENGINES,
+                            default=list(ENGINES))
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        # Pillow выделяет память под пиксели мимо tracemalloc, поэтому
+        # память меряется пиковым RSS процесса-замера (fork).
+        context = multiprocessing.get_context('fork')
+        with tempfile.TemporaryDirectory() as directory:
+            images = options['images'] or self.samples(directory)
+            for path in images:
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    os.path.basename(path)))
+                for alias, (geometry, variant) in THUMBNAIL_VARIANTS.items():
+                    thumbnail_options = {
+                        **ThumbnailBackend.default_options,
+                        'format': 'JPEG', **variant,
+                    }
+                    for name in options['engines']:
+                        results = context.Queue()
+                        process = context.Process(target=run_case, args=(
+                            ENGINES[name], path, geometry, thumbnail_options,
+                            options['repeat'], results))
+                        process.start()
+                        process.join()
+                        if process.exitcode:
+                            raise CommandError(
+                                f'Замер {name} на {path} упал.')
+                        best, peak = results.get()
+                        self.stdout.write(
+                            f'{alias:>12} {name:>6}: {best * 1000:8.1f} мс, '
+                            f'+{peak / 1024:6.1f} МБ RSS')
+
+    def samples(self, directory):
+        paths = []
+        for name, (size, image_format) in SAMPLES.items():
+            path = os.path.join(directory, name)
+            gradient = Image.linear_gradient('L').resize(size)
+            noise = Image.effect_noise(size, 64)
+            Image.merge('RGB', (gradient, noise, gradient.rotate(180))).save(
+                path, image_format)
+            paths.append(path)
+        return paths
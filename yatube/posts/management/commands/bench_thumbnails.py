@@ -0,0 +1,116 @@
+from io import BytesIO
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from PIL import Image
+from sorl.thumbnail.conf import settings as thumbnail_settings
+
+from core import thumbnails
+from posts.benchmarks import measure
+from posts.models import Post, User
+from yatube.settings import POSTS_PER_PAGE
+
+ALIAS = 'post_feed'
+AUTHOR = 'bench_thumbnails'
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск миниатюр страницы ленты по одной и '
+            'пакетом: обращения к кешу, запросы и время. Посты по '
+            'умолчанию — в отдельной базе bench.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='bench',
+                            help='Псевдоним базы для постов.')
+        parser.add_argument('--seed', action='store_true',
+                            help='Создать посты с картинками и миниатюры.')
+        parser.add_argument('--posts', type=int, default=POSTS_PER_PAGE)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        using = options['database']
+        call_command('migrate', database=using, verbosity=0)
+        if options['seed']:
+            self.seed(options['posts'], using)
+        posts = list(Post.objects.using(using).exclude(image='').order_by(
+            '-pub_date', '-pk')[:options['posts']])
+        if not posts:
+            self.stderr.write('Нет постов с картинками: запустите с --seed.')
+            return
+        images = [post.image for post in posts]
+        strategies = {
+            'по одной': lambda: [
+                thumbnails.variant(image, ALIAS) for image in images],
+            'пакетом': lambda: thumbnails.variants(images, ALIAS),
+        }
+        cache = caches[thumbnail_settings.THUMBNAIL_CACHE]
+        self.stdout.write(f'Постов на странице: {len(posts)}')
+        for state in ('холодный', 'тёплый'):
+            for name, lookup in strategies.items():
+                def run():
+                    if state == 'холодный':
+                        cache.clear()
+                    lookup()
+                calls = self.count_cache_calls(cache, run)
+                # Запросы идут в хранилище sorl-thumbnail основной базы.
+                best, queries = measure(run, options['repeat'])
+                self.stdout.write(
+                    f'{state:>9} кеш, {name:>8}: {calls:3} обращений к '
+                    f'кешу, {queries:3} запросов, {best * 1000:7.2f} мс')
+
+    def count_cache_calls(self, cache, func):
+        """Число обращений к кешу верхнего уровня во время func().
+
+        Вложенные вызовы (get_many у LocMemCache вызывает get) не
+        считаются: у сетевых кешей это один сетевой запрос.
+        """
+        calls = 0
+        depth = 0
+
+        def counted(method):
+            def wrapper(*args, **kwargs):
+                nonlocal calls, depth
+                calls += depth == 0
+                depth += 1
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    depth -= 1
+            return wrapper
+
+        names = ('get', 'get_many', 'set', 'set_many')
+        patches = [
+            mock.patch.object(cache, name, counted(getattr(cache, name)))
+            for name in names
+        ]
+        for patch in patches:
+            patch.start()
+        try:
+            func()
+        finally:
+            for patch in patches:
+                patch.stop()
+        return calls
+
+    def seed(self, count, using):
+        # Как posts.benchmarks.seed: bulk_create без сигналов, которые
+        # пишут счётчики и ленты в основную базу.
+        users = User.objects.using(using)
+        if not users.filter(username=AUTHOR).exists():
+            users.bulk_create([User(username=AUTHOR)])
+        author = users.get(username=AUTHOR)
+        posts = []
+        for number in range(count):
+            content = BytesIO()
+            Image.new('RGB', (1200, 900), (number % 256, 80, 160)).save(
+                content, 'JPEG')
+            post = Post(author=author, text=f'Пост с картинкой {number}')
+            post.image.save(f'bench_{number}.jpg',
+                            ContentFile(content.getvalue()), save=False)
+            posts.append(post)
+        Post.objects.using(using).bulk_create(posts)
+        for post in posts:
+            thumbnails.generate(post.image.name)
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from core.media_gc import Collector
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из MEDIA_ROOT картинки, на которые не ссылается ни '
+            'одна модель, и миниатюры, о которых не знает sorl-thumbnail.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать, сколько места уйдёт.')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--max-batches', type=int,
+            help='Обойти не больше стольких пачек файлов и остановиться.')
+        parser.add_argument(
+            '--start-after', default='',
+            help='Продолжить обход файлов после этого пути.')
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Не трогать файлы моложе стольких секунд.')
+
+    def handle(self, *args, **options):
+        collector = Collector(
+            dry_run=options['dry_run'], min_age=options['min_age'],
+            batch_size=options['batch_size'])
+        if not options['start_after']:
+            collector.collect_thumbnail_index()
+        last = collector.collect_files(
+            options['start_after'], options['max_batches'])
+        verb = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} файлов: {collector.files}, '
+            f'{filesizeformat(collector.bytes)}'))
+        if last:
+            self.stdout.write(f'Продолжить: --start-after "{last}"')
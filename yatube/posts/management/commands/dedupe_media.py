@@ -0,0 +1,61 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.defaultfilters import filesizeformat
+
+from core import dependencies
+from core.signals import media_fields
+from core.storage import is_blob, media_storage
+
+
+class Command(BaseCommand):
+    help = ('Переносит загруженные ранее картинки в хранилище по хешу '
+            'содержимого: одинаковые файлы остаются в одном экземпляре.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать, сколько места уйдёт.')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.moved = self.freed = 0
+        self.seen = set()
+        for model in apps.get_models():
+            for field in media_fields(model):
+                self.dedupe_field(model, field)
+        if self.moved and not self.dry_run:
+            # Имена картинок сменены через update(), мимо сигналов.
+            dependencies.expire(dependencies.ALL)
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлов перенесено: {self.moved}, '
+            f'освобождено: {filesizeformat(self.freed)}'))
+        if self.moved and not self.dry_run:
+            self.stdout.write(
+                'Миниатюры перенесённых картинок создаст '
+                'manage.py warm_thumbnails.')
+
+    def dedupe_field(self, model, field):
+        rows = model._default_manager.exclude(
+            **{f'{field.name}__isnull': True}).exclude(**{field.name: ''})
+        names = rows.values_list(field.name, flat=True).distinct()
+        for name in names.iterator():
+            if is_blob(name):
+                continue
+            if not media_storage.exists(name):
+                self.stderr.write(f'{model.__name__}.{field.name}: '
+                                  f'нет файла {name}')
+                continue
+            size = media_storage.size(name)
+            target = media_storage.content_name(name)
+            self.moved += 1
+            if target in self.seen or media_storage.exists(target):
+                self.freed += size
+            self.seen.add(target)
+            if self.dry_run:
+                continue
+            media_storage.adopt(name, target)
+            with transaction.atomic():
+                references = rows.filter(**{field.name: name}).update(
+                    **{field.name: target})
+                media_storage.reference(target, size, references)
+            media_storage.remove(name)
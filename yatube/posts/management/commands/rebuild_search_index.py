@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+from posts.models import PostTerm
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает поисковый индекс постов (после bulk-операций '
+            'в обход сигналов).')
+
+    def handle(self, *args, **options):
+        search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Слов в индексе: {PostTerm.objects.count()}'))
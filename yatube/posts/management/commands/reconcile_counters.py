@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Сверяет денормализованные счётчики с базой и правит расхождения.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать расхождения.')
+
+    def handle(self, *args, **options):
+        drift = counters.reconcile(fix=not options['dry_run'])
+        for (model, field), stale in drift.items():
+            self.stdout.write(f'{model}.{field}: расхождений {stale}')
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS('Счётчики сверены.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Создаёт недостающие варианты миниатюр картинок постов '
+            '(например, загруженных до фоновой генерации).')
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').values_list(
+            'image', flat=True).distinct()
+        created = 0
+        for name in names.iterator():
+            if not thumbnails.missing(name):
+                continue
+            thumbnails.generate(name)
+            created += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинок с новыми миниатюрами: {created}'))
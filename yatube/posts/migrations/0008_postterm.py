@@ -0,0 +1,65 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:07
+
+import re
+from collections import Counter
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+TERM_RE = re.compile(r'\w+')
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 64
+
+
+def _tokenize(text):
+    # Копия posts.search.tokenize на момент миграции.
+    return Counter(
+        term[:MAX_TERM_LENGTH]
+        for term in TERM_RE.findall(text.lower().replace('ё', 'е'))
+        if len(term) >= MIN_TERM_LENGTH
+    )
+
+
+def build_index(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    PostTerm = apps.get_model('posts', 'PostTerm')
+    batch = []
+    db_alias = schema_editor.connection.alias
+    for post in Post.objects.using(db_alias).only('pk', 'text').iterator():
+        batch.extend(
+            PostTerm(term=term, post_id=post.pk, weight=weight)
+            for term, weight in _tokenize(post.text).items()
+        )
+        if len(batch) >= BATCH_SIZE:
+            PostTerm.objects.using(db_alias).bulk_create(batch)
+            batch = []
+    PostTerm.objects.using(db_alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Слово')),
+                ('weight', models.PositiveIntegerField(verbose_name='Частота в тексте')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Слово поискового индекса',
+                'verbose_name_plural': 'Поисковый индекс',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='postterm',
+            constraint=models.UniqueConstraint(fields=('term', 'post'), name='unique_post_term'),
+        ),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
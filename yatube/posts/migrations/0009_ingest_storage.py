@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:23
+
+import core.images
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_postterm'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=core.images.IngestStorage(), upload_to='posts/', validators=[core.images.validate_upload], verbose_name='Картинка'),
+        ),
+    ]
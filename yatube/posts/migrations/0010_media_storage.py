@@ -0,0 +1,20 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:26
+
+import core.images
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_ingest_storage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, storage=core.storage.DedupStorage(), upload_to='posts/', validators=[core.images.validate_upload], verbose_name='Картинка'),
+        ),
+    ]
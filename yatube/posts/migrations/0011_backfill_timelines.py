@@ -0,0 +1,47 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:10
+
+from django.db import migrations
+
+# Постов в ленте каждого читателя после заполнения: старее лента
+# подписок не листается на практике, а таблица не разрастается.
+ENTRIES_PER_READER = 1000
+
+
+def backfill_timelines(apps, schema_editor):
+    """Ленты подписок по существующим подпискам, одним INSERT ... SELECT.
+
+    Уже разложенные записи (fan-out после 0005) пропускаются.
+    """
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    quote = schema_editor.quote_name
+    timeline = quote(TimelineEntry._meta.db_table)
+    sql = (
+        f'INSERT INTO {timeline} (user_id, post_id, pub_date) '
+        'SELECT user_id, post_id, pub_date FROM ('
+        'SELECT f.user_id AS user_id, p.id AS post_id, '
+        'p.pub_date AS pub_date, ROW_NUMBER() OVER ('
+        'PARTITION BY f.user_id ORDER BY p.pub_date DESC, p.id DESC'
+        ') AS position '
+        f'FROM {quote(Follow._meta.db_table)} f '
+        f'JOIN {quote(Post._meta.db_table)} p '
+        'ON p.author_id = f.author_id'
+        ') ranked '
+        'WHERE position <= %s AND NOT EXISTS ('
+        f'SELECT 1 FROM {timeline} e '
+        'WHERE e.user_id = ranked.user_id AND e.post_id = ranked.post_id)'
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(sql, [ENTRIES_PER_READER])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_media_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,9 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from core.images import validate_upload
+from core.storage import media_storage
+
 User = get_user_model()
 
 
@@ -48,13 +51,36 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=media_storage,
+        validators=[validate_upload],
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Ленты сортируются по (-pub_date, -id), в том числе внутри
+        # группы и автора: индексы отдают страницу без сортировки.
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -78,6 +104,12 @@ class Comment(models.Model):
 
     class Meta:
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', 'created', 'id'],
+                name='comment_post_created_idx'
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -105,6 +137,77 @@ class Follow(models.Model):
                 name="prevent_self_follow",
             ),
         ]
+        # (user, author) покрывает уникальное ограничение,
+        # обратный порядок нужен для выборки подписчиков автора.
+        indexes = [
+            models.Index(
+                fields=["author", "user"],
+                name="follow_author_user_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user} follows {self.author}"
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    # Копия Post.pub_date: лента читается по индексу (user, -pub_date, -post).
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user} <- {self.post_id}'
+
+
+class PostTerm(models.Model):
+    """Запись инвертированного индекса поиска: слово поста и его частота."""
+    term = models.CharField('Слово', max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name='Пост',
+    )
+    weight = models.PositiveIntegerField('Частота в тексте')
+
+    class Meta:
+        verbose_name = 'Слово поискового индекса'
+        verbose_name_plural = 'Поисковый индекс'
+        # Индекс ограничения (term, post) и есть инвертированный список.
+        constraints = [
+            models.UniqueConstraint(
+                fields=['term', 'post'],
+                name='unique_post_term'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.term} -> {self.post_id}'
@@ -0,0 +1,260 @@
+import base64
+import binascii
+import datetime
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import F, Q
+from django.db.models.constants import LOOKUP_SEP
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from core import dependencies
+from yatube.settings import (PAGINATOR_COUNT_TIMEOUT,
+                             PAGINATOR_ESTIMATE_THRESHOLD)
+
+
+class InvalidCursor(Exception):
+    """Курсор не удалось разобрать."""
+
+
+def encode_cursor(values, reverse=False):
+    """Упаковывает позицию в ленте в непрозрачную строку."""
+    payload = [
+        {'dt': value.isoformat()}
+        if isinstance(value, datetime.datetime) else value
+        for value in values
+    ]
+    data = json.dumps([int(reverse), payload], separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Разбирает курсор, возвращает (значения ключа, направление)."""
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        reverse, payload = json.loads(data.decode())
+        values = []
+        for value in payload:
+            if isinstance(value, dict):
+                value = parse_datetime(value['dt'])
+                if value is None:
+                    raise ValueError
+            values.append(value)
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise InvalidCursor(cursor)
+    return values, bool(reverse)
+
+
+class CursorPage(Page):
+    """Страница ленты по курсору, совместимая с шаблонами паджинатора."""
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Паджинатор по ключу (pub_date, id): без COUNT(*) и OFFSET.
+
+    Стоимость любой страницы одинакова: это выборка по индексу
+    от позиции, зашитой в курсор, на per_page + 1 строк.
+    Если ordering не задан, берётся явный order_by() выборки.
+    Поля через связи (timeline_entries__pub_date) подставляются
+    аннотациями, чтобы условие курсора не добавляло новых JOIN.
+    """
+    default_ordering = ('-pub_date', '-pk')
+
+    def __init__(self, object_list, per_page, ordering=None):
+        super().__init__(object_list, per_page)
+        self.ordering = tuple(
+            ordering or object_list.query.order_by or self.default_ordering)
+        self.key_fields = []
+        self.model_fields = []
+        self.annotations = {}
+        for field in self.ordering:
+            path = field.lstrip('-')
+            name = path
+            if LOOKUP_SEP in path:
+                name = 'cursor_' + path.replace(LOOKUP_SEP, '_')
+                self.annotations[name] = F(path)
+            self.key_fields.append((name, field.startswith('-')))
+            self.model_fields.append(self._model_field(path))
+
+    def _model_field(self, path):
+        annotation = self.object_list.query.annotations.get(path)
+        if annotation is not None:
+            return annotation.output_field
+        model = self.object_list.model
+        for part in path.split(LOOKUP_SEP):
+            field = (model._meta.pk if part == 'pk'
+                     else model._meta.get_field(part))
+            model = field.related_model or model
+        return field
+
+    def get_page(self, cursor):
+        """Как Paginator.get_page: битый курсор даёт первую страницу."""
+        if not cursor:
+            return self.page()
+        try:
+            values, reverse = decode_cursor(cursor)
+        except InvalidCursor:
+            return self.page()
+        if len(values) != len(self.key_fields):
+            return self.page()
+        try:
+            values = [
+                self._clean(field, value)
+                for field, value in zip(self.model_fields, values)
+            ]
+        except InvalidCursor:
+            return self.page()
+        return self.page(values, reverse)
+
+    @staticmethod
+    def _clean(field, value):
+        """Значение курсора того типа, что у поля ключа, иначе ошибка."""
+        if field.get_internal_type() == 'DateTimeField':
+            if not isinstance(value, datetime.datetime):
+                raise InvalidCursor(value)
+            return value
+        if value is None or isinstance(value, (list, dict)):
+            raise InvalidCursor(value)
+        try:
+            return field.to_python(value)
+        except (ValidationError, TypeError, ValueError):
+            raise InvalidCursor(value)
+
+    def page(self, values=None, reverse=False):
+        rows = self.object_list
+        if self.annotations:
+            rows = rows.annotate(**self.annotations)
+        if values is not None:
+            rows = rows.filter(self._seek(values, reverse))
+        rows = list(rows.order_by(*self._ordering(reverse))[
+            :self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor(self._key(rows[-1]))
+        if rows and has_previous:
+            previous_cursor = encode_cursor(self._key(rows[0]), reverse=True)
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    def _ordering(self, reverse):
+        return tuple(
+            ('-' if descending != reverse else '') + name
+            for name, descending in self.key_fields
+        )
+
+    def _key(self, obj):
+        return [getattr(obj, name) for name, _ in self.key_fields]
+
+    def _seek(self, values, reverse):
+        """Условие «строго после позиции» в лексикографическом порядке."""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.key_fields, values):
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+
+def estimate_count(model, using=DEFAULT_DB_ALIAS):
+    """Дешёвая оценка числа строк таблицы без COUNT(*) или None."""
+    connection = connections[using]
+    table = model._meta.db_table
+    queries = {
+        'postgresql': (
+            'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+            [table]),
+        'mysql': (
+            'SELECT table_rows FROM information_schema.tables '
+            'WHERE table_schema = DATABASE() AND table_name = %s', [table]),
+        # В SQLite статистики нет: максимальный rowid — оценка сверху.
+        'sqlite': (
+            f'SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}', []),
+    }
+    if connection.vendor not in queries:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(*queries[connection.vendor])
+        row = cursor.fetchone()
+    return row[0] if row and row[0] is not None else None
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который не считает COUNT(*) на каждый запрос.
+
+    Точное число строк кешируется на PAGINATOR_COUNT_TIMEOUT по сигнатуре
+    выборки и поколениям её зависимостей dependencies (core.dependencies):
+    'posts:group:N' для постов группы, 'comments' для всех комментариев.
+    Запись в другие ленты число не сбрасывает. Для выборки без фильтров
+    по большой таблице берётся оценка из статистики СУБД, и
+    count_is_estimate говорит шаблону писать «из примерно M».
+    """
+    page_window_size = 3
+
+    def __init__(self, object_list, per_page, orphans=0,
+                 allow_empty_first_page=True, estimate_threshold=None,
+                 dependencies=()):
+        super().__init__(
+            object_list, per_page, orphans, allow_empty_first_page)
+        self.dependencies = dependencies
+        if estimate_threshold is None:
+            estimate_threshold = PAGINATOR_ESTIMATE_THRESHOLD
+        self.estimate_threshold = estimate_threshold
+        self.count_is_estimate = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        signature = hashlib.md5(
+            str(queryset.order_by().query).encode()).hexdigest()
+        key = (f'paginator_count:{queryset.db}:{signature}:'
+               f'{dependencies.version(*self.dependencies)}')
+        cached = cache.get(key)
+        if cached is None:
+            cached = self._count(queryset)
+            cache.set(key, cached, PAGINATOR_COUNT_TIMEOUT)
+        count, self.count_is_estimate = cached
+        return count
+
+    def _count(self, queryset):
+        if not queryset.query.where:
+            estimate = estimate_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.estimate_threshold:
+                return estimate, True
+        return queryset.count(), False
+
+    def page(self, number):
+        page = super().page(number)
+        # Окно номеров вокруг текущей страницы: без цикла по всем
+        # страницам, которых при оценке могут быть сотни тысяч.
+        first = max(page.number - self.page_window_size, 1)
+        last = min(page.number + self.page_window_size, self.num_pages)
+        page.page_window = range(first, last + 1)
+        return page
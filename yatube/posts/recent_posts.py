@@ -0,0 +1,169 @@
+"""Буферы последних постов авторов для ленты подписок (pull-модель).
+
+Для каждого автора в кеше лежит ограниченный список последних постов
+[(timestamp, id), ...] по убыванию. Лента подписок сливает списки
+авторов кучей (heapq.merge) и достаёт из базы только посты страницы,
+поэтому запись поста не зависит от числа подписчиков автора.
+Буферы разных баз (например, bench) не пересекаются.
+
+Буфер меняется после фиксации транзакции и под блокировкой
+(cache.add, core.stampede), чтобы одновременные push() и discard()
+не затирали друг друга; FOLLOW_FEED_BUFFER_TIMEOUT ограничивает срок
+жизни расхождения с базой, если оно всё же случится.
+"""
+import heapq
+import time
+from functools import partial
+from itertools import islice
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from core import stampede
+from yatube.settings import (
+    FOLLOW_FEED_BUFFER_SIZE, FOLLOW_FEED_BUFFER_TIMEOUT, STAMPEDE_WAIT)
+from .models import Follow, Post
+
+KEY_PREFIX = 'recent_posts'
+
+
+def buffer_key(author_id, using=DEFAULT_DB_ALIAS):
+    return f'{KEY_PREFIX}:{using}:{author_id}'
+
+
+def _entry(post):
+    return (post.pub_date.timestamp(), post.pk)
+
+
+def _load(author_id, using):
+    """Буфер автора из базы: (записи, исчерпан ли список автора)."""
+    posts = Post.objects.using(using).filter(author_id=author_id).order_by(
+        '-pub_date', '-pk')[:FOLLOW_FEED_BUFFER_SIZE + 1]
+    entries = [_entry(post) for post in posts.only('pk', 'pub_date')]
+    exhausted = len(entries) <= FOLLOW_FEED_BUFFER_SIZE
+    return entries[:FOLLOW_FEED_BUFFER_SIZE], exhausted
+
+
+def get_buffers(author_ids, using=DEFAULT_DB_ALIAS):
+    """Буферы авторов: одно обращение к кешу, промахи — из базы."""
+    keys = {
+        buffer_key(author_id, using): author_id for author_id in author_ids
+    }
+    buffers = {
+        keys[key]: value for key, value in cache.get_many(keys).items()
+    }
+    missing = {}
+    for key, author_id in keys.items():
+        if author_id not in buffers:
+            buffers[author_id] = missing[key] = _load(author_id, using)
+    if missing:
+        cache.set_many(missing, FOLLOW_FEED_BUFFER_TIMEOUT)
+    return buffers
+
+
+def push(post):
+    """Добавляет новый пост в буфер автора, если тот уже в кеше."""
+    entry = _entry(post)
+
+    def change(entries, exhausted):
+        entries = sorted(entries + [entry], reverse=True)
+        if len(entries) > FOLLOW_FEED_BUFFER_SIZE:
+            entries, exhausted = entries[:FOLLOW_FEED_BUFFER_SIZE], False
+        return entries, exhausted
+    _update_on_commit(post, change)
+
+
+def discard(post):
+    """Убирает удалённый пост из буфера автора."""
+    # После удаления Django обнуляет pk, а изменение выполнится позже.
+    pk = post.pk
+
+    def change(entries, exhausted):
+        return [entry for entry in entries if entry[1] != pk], exhausted
+    _update_on_commit(post, change)
+
+
+def _update_on_commit(post, change):
+    using = post._state.db
+    transaction.on_commit(
+        partial(_update, buffer_key(post.author_id, using), change),
+        using=using)
+
+
+def _update(key, change):
+    """change(записи, исчерпан) под блокировкой буфера key.
+
+    Блокировку держат мгновения, поэтому её ждут; если она так и не
+    освободилась, буфер сбрасывается и перечитывается из базы.
+    """
+    deadline = time.monotonic() + STAMPEDE_WAIT
+    while True:
+        with stampede.recompute_lock(key) as acquired:
+            if acquired:
+                buffer = cache.get(key)
+                if buffer is not None:
+                    cache.set(
+                        key, change(*buffer), FOLLOW_FEED_BUFFER_TIMEOUT)
+                return
+        if time.monotonic() > deadline:
+            cache.delete(key)
+            return
+        time.sleep(stampede.POLL_INTERVAL)
+
+
+class MergedFeed:
+    """Лента подписок как последовательность для Paginator.
+
+    Срез в пределах глубины буферов собирается слиянием списков
+    авторов; глубже — отдаётся обычным запросом с соединением.
+    """
+
+    def __init__(self, user, queryset=None):
+        self.queryset = queryset if queryset is not None else Post.objects
+        self.author_ids = list(Follow.objects.using(self.queryset.db).filter(
+            user=user).values_list('author_id', flat=True))
+        self._buffers = None
+        self._count = None
+
+    @property
+    def buffers(self):
+        if self._buffers is None:
+            self._buffers = get_buffers(self.author_ids, self.queryset.db)
+        return self._buffers
+
+    @property
+    def depth(self):
+        """Сколько первых постов ленты гарантированно есть в буферах."""
+        return min(
+            (len(entries) for entries, exhausted in self.buffers.values()
+             if not exhausted),
+            default=None,
+        )
+
+    def count(self):
+        if self._count is None:
+            if self.depth is None:
+                self._count = sum(
+                    len(entries) for entries, _ in self.buffers.values())
+            else:
+                self._count = self.queryset.filter(
+                    author_id__in=self.author_ids).count()
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        depth = self.depth
+        if stop is None or (depth is not None and stop > depth):
+            return list(self.queryset.filter(
+                author_id__in=self.author_ids).order_by(
+                    '-pub_date', '-pk')[index])
+        merged = heapq.merge(
+            *(entries for entries, _ in self.buffers.values()), reverse=True)
+        ids = [post_id for _, post_id in islice(merged, start, stop)]
+        posts = self.queryset.in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
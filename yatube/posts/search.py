@@ -0,0 +1,73 @@
+"""Полнотекстовый поиск по постам на инвертированном индексе.
+
+Индекс — таблица PostTerm (слово, пост, частота), обновляется
+сигналами при создании и правке поста, а при удалении уходит каскадом.
+Поиск ищет посты, содержащие все слова запроса, и ранжирует их по
+сумме частот слов; при равенстве новые посты выше.
+"""
+import re
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from .models import Post, PostTerm
+
+TERM_RE = re.compile(r'\w+')
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = PostTerm._meta.get_field('term').max_length
+MAX_QUERY_TERMS = 8
+REBUILD_BATCH_SIZE = 1000
+
+
+def tokenize(text):
+    """Слова текста в нормализованном виде с частотами."""
+    return Counter(
+        term[:MAX_TERM_LENGTH]
+        for term in TERM_RE.findall(text.lower().replace('ё', 'е'))
+        if len(term) >= MIN_TERM_LENGTH
+    )
+
+
+def _terms(post):
+    return [
+        PostTerm(term=term, post_id=post.pk, weight=weight)
+        for term, weight in tokenize(post.text).items()
+    ]
+
+
+@transaction.atomic
+def index_post(post):
+    """Переиндексирует один пост (создание и правка)."""
+    PostTerm.objects.filter(post_id=post.pk).delete()
+    PostTerm.objects.bulk_create(_terms(post))
+
+
+@transaction.atomic
+def rebuild():
+    """Строит индекс заново по всем постам."""
+    PostTerm.objects.all().delete()
+    batch = []
+    for post in Post.objects.only('pk', 'text').iterator():
+        batch.extend(_terms(post))
+        if len(batch) >= REBUILD_BATCH_SIZE:
+            PostTerm.objects.bulk_create(batch)
+            batch = []
+    PostTerm.objects.bulk_create(batch)
+
+
+def search(query, queryset=None):
+    """Посты со всеми словами запроса, по убыванию релевантности.
+
+    Каждый пост размечен аннотацией score; порядок (-score, -pk)
+    годится для CursorPaginator.
+    """
+    if queryset is None:
+        queryset = Post.objects.all()
+    terms = list(tokenize(query))[:MAX_QUERY_TERMS]
+    if not terms:
+        return queryset.none()
+    return queryset.filter(search_terms__term__in=terms).annotate(
+        score=Sum('search_terms__weight'),
+        matched=Count('search_terms'),
+    ).filter(matched=len(terms)).order_by('-score', '-pk')
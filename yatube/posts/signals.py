@@ -0,0 +1,121 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core import dependencies, thumbnails
+from users.models import Profile
+from yatube.settings import FOLLOW_FEED_ENGINE
+from . import counters, feed_cache, recent_posts, search, timeline
+from .models import Comment, Follow, Group, Post, User
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    """Новый пост попадает в ленты подписчиков и в буфер автора."""
+    if created and not raw:
+        recent_posts.push(instance)
+        if FOLLOW_FEED_ENGINE == 'timeline':
+            timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=Follow)
+def count_created(sender, instance, created, raw=False, **kwargs):
+    """Счётчики ведутся при любой записи через ORM, не только из views."""
+    if created and not raw:
+        change_count(instance, 1)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Follow)
+def count_deleted(sender, instance, **kwargs):
+    """Удаление идёт в транзакции Collector.delete: счётчик меняется
+    атомарно вместе со строкой."""
+    change_count(instance, -1)
+
+
+def change_count(instance, delta):
+    if isinstance(instance, Post):
+        counters.change_posts_count(instance.author_id, delta)
+    elif isinstance(instance, Comment):
+        counters.change_comments_count(instance.post_id, delta)
+    else:
+        counters.change_follow_counts(
+            instance.user_id, instance.author_id, delta)
+
+
+@receiver(pre_save, sender=Post)
+def remember_image(sender, instance, raw=False, **kwargs):
+    instance._saved_image = None
+    if not raw and not instance._state.adding:
+        instance._saved_image = Post.objects.filter(
+            pk=instance.pk).values_list('image', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def schedule_thumbnails(sender, instance, raw=False, **kwargs):
+    """Миниатюры новой картинки ставятся в очередь при любой записи
+    через ORM: из форм, админки или shell."""
+    if not raw and instance.image and (
+            instance.image.name != instance._saved_image):
+        thumbnails.schedule(instance.image)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, **kwargs):
+    """Созданный или изменённый пост переиндексируется для поиска.
+
+    Слова удалённого поста убирает каскад по PostTerm.post.
+    """
+    if not raw:
+        search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def discard_post(sender, instance, **kwargs):
+    """Удалённый пост уходит из буфера автора.
+
+    Записи ленты удалённого поста убирает каскад по TimelineEntry.post.
+    """
+    recent_posts.discard(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, raw=False, **kwargs):
+    """После подписки в ленту добавляются посты автора."""
+    if created and not raw and FOLLOW_FEED_ENGINE == 'timeline':
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def drop_from_timeline(sender, instance, **kwargs):
+    """После отписки посты автора уходят из ленты."""
+    if FOLLOW_FEED_ENGINE == 'timeline':
+        timeline.drop_author(instance.user_id, instance.author_id)
+
+
+dependencies.track(
+    Post, feed_cache.post_dependencies,
+    fields=('author_id', 'group_id', 'text', 'image', 'pub_date'))
+dependencies.track(Comment, feed_cache.comment_dependencies)
+dependencies.track(Follow, feed_cache.follow_dependencies)
+dependencies.track(
+    Group, feed_cache.group_dependencies,
+    fields=('title', 'slug', 'description'))
+dependencies.track(
+    Profile, feed_cache.profile_dependencies, fields=('bio', 'profile_pic'))
+# Сохранение пользователя при входе (last_login) лент не трогает.
+dependencies.track(
+    User, feed_cache.user_dependencies,
+    fields=('username', 'first_name', 'last_name'))
+
+
+@receiver(thumbnails.thumbnails_ready)
+def expire_thumbnail_pages(sender, name, **kwargs):
+    """Готовые миниатюры заменяют заглушки в кеше страниц."""
+    names = []
+    for post in Post.objects.filter(image=name).only(
+            'pk', 'author_id', 'group_id'):
+        names.extend(feed_cache.post_dependencies(post))
+    dependencies.expire(*names)
@@ -0,0 +1,84 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post, User
+
+
+class ConditionalGetTests(TransactionTestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(
+            title='Группа', slug='conditional', description='Описание')
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост')
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        )
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+        self.clients = {'guest': Client(), 'author': self.authorized_client}
+
+    def etag(self, client, url):
+        # Первый ответ выставляет cookie CSRF, от которой зависит ETag.
+        client.get(url)
+        return client.get(url)['ETag']
+
+    def test_unchanged_page_not_modified(self):
+        """Неизменная страница — 304 без запросов к базе и шаблонов."""
+        for name, client in self.clients.items():
+            for url in self.urls:
+                with self.subTest(client=name, url=url):
+                    etag = self.etag(client, url)
+                    with CaptureQueriesContext(connection) as queries:
+                        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+                    self.assertEqual(response.status_code, 304)
+                    self.assertEqual(len(queries), 0)
+                    self.assertEqual(response.templates, [])
+
+    def test_write_changes_etag(self):
+        """Новый комментарий меняет ETag: страница рендерится заново."""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        client = self.clients['guest']
+        etag = self.etag(client, url)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий')
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Комментарий')
+
+    def test_user_changes_etag(self):
+        """Смена имени автора, его профиля или подписчиков меняет ETag."""
+        url = reverse('posts:profile', args=(self.author.username,))
+        client = self.clients['guest']
+
+        def rename():
+            self.author.first_name = 'Лев'
+            self.author.save()
+
+        def edit_bio():
+            self.author.profile.bio = 'О себе'
+            self.author.profile.save()
+
+        def follow():
+            Follow.objects.create(
+                user=User.objects.create_user(username='reader'),
+                author=self.author)
+        for write in (rename, edit_bio, follow):
+            with self.subTest(write=write.__name__):
+                etag = self.etag(client, url)
+                write()
+                self.assertNotEqual(self.etag(client, url), etag)
+
+    def test_etag_depends_on_user(self):
+        """Гость и автор не получают ETag друг друга."""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        self.assertNotEqual(
+            self.etag(self.clients['guest'], url),
+            self.etag(self.clients['author'], url))
@@ -0,0 +1,98 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from core import dependencies
+from ..models import Comment, Follow, Group, Post, User
+
+
+class DependencyTrackingTests(TransactionTestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа', slug='first', description='Описание')
+        self.other_group = Group.objects.create(
+            title='Другая', slug='second', description='Описание')
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост')
+        cache.clear()
+
+    def expired(self, write, names):
+        """Какие из names сменили поколение после write()."""
+        before = dependencies.versions(names)
+        write()
+        after = dependencies.versions(names)
+        return {name for name in names if before[name] != after[name]}
+
+    def test_post_move_expires_both_groups(self):
+        """Пост, перенесённый в другую группу, сбрасывает обе."""
+        def move():
+            self.post.group = self.other_group
+            self.post.save()
+        names = [
+            f'posts:group:{self.group.pk}',
+            f'posts:group:{self.other_group.pk}',
+            f'posts:author:{self.reader.pk}',
+            f'comments:post:{self.post.pk}',
+        ]
+        self.assertEqual(self.expired(move, names), set(names[:2]))
+
+    def test_comment_expires_only_its_post(self):
+        names = [
+            f'comments:post:{self.post.pk}', f'post:{self.post.pk}', 'posts',
+        ]
+        self.assertEqual(
+            self.expired(lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий'),
+                names),
+            {names[0]})
+
+    def test_follow_expires_both_profiles(self):
+        names = [f'profile:{self.author.pk}', f'profile:{self.reader.pk}',
+                 'authors']
+        self.assertEqual(
+            self.expired(lambda: Follow.objects.create(
+                user=self.reader, author=self.author), names),
+            set(names[:2]))
+
+    def test_unchanged_fields_expire_nothing(self):
+        """Вход (last_login) и пересохранение без правок лент не трогают,
+        смена имени автора — сбрасывает."""
+        def login():
+            self.author.last_login = timezone.now()
+            self.author.save()
+            self.group.save()
+
+        def rename():
+            self.author.first_name = 'Лев'
+            self.author.save()
+        names = ['authors', 'groups', f'profile:{self.author.pk}']
+        self.assertEqual(self.expired(login, names), set())
+        self.assertEqual(self.expired(rename, names), {'authors', names[2]})
+
+    def test_expired_after_commit(self):
+        """Поколение меняется при фиксации, а не внутри транзакции."""
+        names = [f'post:{self.post.pk}']
+
+        def edit():
+            with transaction.atomic():
+                self.post.text = 'Новый текст'
+                self.post.save()
+                self.assertEqual(dependencies.versions(names), before)
+        before = dependencies.versions(names)
+        self.assertEqual(self.expired(edit, names), set(names))
+
+    def test_fragment_survives_unrelated_write(self):
+        """Фрагмент профиля не пересчитывается после записи в чужую
+        группу и пересчитывается после нового поста автора."""
+        url = f'/profile/{self.author.username}/'
+        version = self.client.get(url).context['feed_version']
+        Post.objects.create(
+            author=self.reader, group=self.other_group, text='Чужой')
+        self.assertEqual(self.client.get(url).context['feed_version'],
+                         version)
+        Post.objects.create(author=self.author, text='Свой')
+        self.assertNotEqual(self.client.get(url).context['feed_version'],
+                            version)
@@ -0,0 +1,132 @@
+from contextlib import contextmanager
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Group, Post, User
+
+
+@contextmanager
+def locked_elsewhere(key):
+    yield False
+
+
+@mock.patch('core.pagecache.PAGE_CACHE_TIMEOUT', 60)
+class PageCacheTests(TransactionTestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.group = Group.objects.create(
+            title='Группа', slug='pagecache', description='Описание')
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост')
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        )
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_guest_page_cached(self):
+        """Повторный запрос гостя отдаётся из кеша без запросов к базе."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.guest_client.get(url)
+                self.assertEqual(first['X-Cache'], 'MISS')
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.guest_client.get(url)
+                self.assertEqual(response['X-Cache'], 'HIT')
+                self.assertEqual(len(queries), 0)
+                self.assertEqual(response.content, first.content)
+                self.assertEqual(int(response['Age']), 0)
+
+    def test_guest_post_with_comments_cached(self):
+        """Пост с комментариями кешируется: гостю не выводятся формы
+        удаления с CSRF-токеном."""
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий')
+        url = self.urls[3]
+        self.assertEqual(self.guest_client.get(url)['X-Cache'], 'MISS')
+        response = self.guest_client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertContains(response, 'Комментарий')
+        self.assertNotContains(response, 'csrfmiddlewaretoken')
+
+    def test_cached_page_not_modified(self):
+        """Страница из кеша отвечает 304 на совпавший ETag."""
+        url = self.urls[0]
+        etag = self.guest_client.get(url)['ETag']
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_write_invalidates_tagged_pages(self):
+        """Запись сбрасывает только страницы со своими тегами."""
+        detail, profile = self.urls[3], self.urls[2]
+        for url in (detail, profile):
+            self.guest_client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий')
+        response = self.guest_client.get(detail)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Комментарий')
+        self.assertEqual(self.guest_client.get(profile)['X-Cache'], 'HIT')
+
+    def test_group_rename_invalidates_profile(self):
+        """Новый адрес группы виден в профиле автора её постов."""
+        profile = self.urls[2]
+        self.guest_client.get(profile)
+        self.group.slug = 'renamed'
+        self.group.save()
+        response = self.guest_client.get(profile)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, '/group/renamed/')
+
+    def test_stale_page_while_recomputed(self):
+        """Пока страницу пересчитывает другой запрос, отдаётся прошлая."""
+        detail = self.urls[3]
+        self.guest_client.get(detail)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий')
+        with mock.patch(
+                'core.stampede.recompute_lock', locked_elsewhere):
+            response = self.guest_client.get(detail)
+        self.assertEqual(response['X-Cache'], 'STALE')
+        self.assertNotContains(response, 'Комментарий')
+
+    def test_uncached_page_not_locked(self):
+        """Без записи в кеше страница отдаётся без блокировки."""
+        with mock.patch('core.stampede.recompute_lock') as lock:
+            self.guest_client.get(reverse('posts:search'), {'q': 'Пост'})
+            self.guest_client.get(self.urls[0])
+        keys = [call.args[0] for call in lock.call_args_list]
+        self.assertFalse([key for key in keys if key.startswith('page:')])
+
+    def test_new_post_invalidates_feeds(self):
+        """Новый пост виден в ленте, группе и профиле автора."""
+        for url in self.urls[:3]:
+            self.guest_client.get(url)
+        Post.objects.create(
+            author=self.author, group=self.group, text='Новый пост')
+        for url in self.urls[:3]:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response['X-Cache'], 'MISS')
+                self.assertContains(response, 'Новый пост')
+
+    def test_authorized_user_not_cached(self):
+        """Страницы пользователя с сессией не кешируются и не берутся
+        из кеша гостей."""
+        client = Client()
+        client.force_login(self.author)
+        url = self.urls[0]
+        self.guest_client.get(url)
+        for _ in range(2):
+            response = client.get(url)
+            self.assertNotIn('X-Cache', response)
+            self.assertIsNotNone(response.context)
@@ -1,7 +1,14 @@
-from django.test import Client, TestCase
+import base64
+import json
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from yatube.settings import POSTS_PER_PAGE
-from ..models import Group, Post, User
+from ..models import Comment, Group, Post, User
+from ..pagination import CachedCountPaginator
 
 
 class PaginatorViewsTest(TestCase):
@@ -21,6 +28,9 @@ class PaginatorViewsTest(TestCase):
         )
 
     def setUp(self):
+        # В TestCase версии зависимостей не растут (on_commit не
+        # выполняется): число постов прошлых тестов осталось бы в кеше.
+        cache.clear()
         self.guest_client = Client()
         self.user = User.objects.get(username='auth')
         self.authorized_client = Client()
@@ -46,3 +56,116 @@ class PaginatorViewsTest(TestCase):
                     POSTS_PER_PAGE)
                 response = self.guest_client.get(reverse_name + '?page=2')
                 self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_cursor_pages_walk_whole_feed(self):
+        """Курсорная паджинация проходит ленту без пропусков и повторов."""
+        pages_names = [
+            reverse('posts:index'),
+            reverse(
+                'posts:group_list',
+                kwargs={'slug': 'test-slug'}
+            ),
+            reverse(
+                'posts:profile',
+                kwargs={'username': 'auth'}
+            )
+        ]
+        expected = list(Post.objects.order_by('-pub_date', '-pk'))
+        for reverse_name in pages_names:
+            with self.subTest(reverse_name=reverse_name):
+                response = self.guest_client.get(reverse_name + '?cursor=')
+                first_page = response.context['page_obj']
+                self.assertFalse(first_page.has_previous())
+                self.assertEqual(len(first_page), POSTS_PER_PAGE)
+                response = self.guest_client.get(
+                    reverse_name + '?cursor=' + first_page.next_cursor)
+                second_page = response.context['page_obj']
+                self.assertFalse(second_page.has_next())
+                self.assertEqual(
+                    list(first_page) + list(second_page), expected)
+                response = self.guest_client.get(
+                    reverse_name + '?cursor=' + second_page.previous_cursor)
+                self.assertEqual(
+                    list(response.context['page_obj']), list(first_page))
+
+    def test_malformed_cursor_gives_first_page(self):
+        """Курсор с чужими типами значений — первая страница, не 500."""
+        post = Post.objects.first()
+        Comment.objects.create(post=post, author=self.user, text='Текст')
+        payloads = (
+            [0, ['x', 'y']],
+            [0, [{'dt': '2021-01-01T00:00:00'}, 'abc']],
+            [0, [None, None]],
+            [0, [[1], [2]]],
+            [0, [{'dt': '2021-01-01T00:00:00'}, {'x': 1}]],
+        )
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:post_comments', kwargs={'post_id': post.pk}),
+        )
+        for url in urls:
+            for payload in payloads:
+                cursor = base64.urlsafe_b64encode(
+                    json.dumps(payload).encode()).decode()
+                with self.subTest(url=url, payload=payload):
+                    response = self.guest_client.get(
+                        url, {'cursor': cursor})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertFalse(
+                        response.context['comments' if 'comments' in url
+                                         else 'page_obj'].has_previous())
+
+    def test_estimated_count(self):
+        """Большая таблица без фильтров считается по оценке."""
+        paginator = CachedCountPaginator(
+            Post.objects.all(), POSTS_PER_PAGE, estimate_threshold=5)
+        self.assertGreaterEqual(paginator.count, 13)
+        self.assertTrue(paginator.count_is_estimate)
+        page = paginator.page(1)
+        self.assertEqual(list(page.page_window), [1, 2])
+
+
+class CountCacheTests(TransactionTestCase):
+    """Кеш числа постов сбрасывается после фиксации записи."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='auth')
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            [Post(author=self.user, group=self.group, text='Текст')
+             for _ in range(13)]
+        )
+        self.guest_client = Client()
+
+    def test_count_cached_between_requests(self):
+        """Число постов не пересчитывается, пока лента не изменилась."""
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        self.guest_client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(url + '?page=2')
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries))
+        Post.objects.create(author=self.user, group=self.group, text='Ещё')
+        response = self.guest_client.get(url + '?page=2')
+        self.assertEqual(len(response.context['page_obj']), 4)
+
+    def test_count_survives_writes_to_other_feeds(self):
+        """Комментарий и пост в другой группе не сбрасывают число постов
+        группы."""
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        self.guest_client.get(url)
+        other = Group.objects.create(
+            title='Другая', slug='other-slug', description='Описание')
+        Post.objects.create(author=self.user, group=other, text='Чужой')
+        Comment.objects.create(
+            post=Post.objects.filter(group=self.group).first(),
+            author=self.user, text='Комментарий')
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(url + '?page=2')
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries))
@@ -0,0 +1,136 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from .. import timeline
+from ..models import Comment, Follow, Group, Post, User
+
+# Верхняя граница запросов на одно открытие страницы с холодным кешем.
+# Она не должна зависеть от числа постов и комментариев: рост — это N+1.
+# На главной добавляется оценка размера таблицы для паджинатора.
+QUERY_BUDGETS = {
+    'index': 3,
+    'group_list': 3,
+    'profile': 3,
+    'post_detail': 3,
+    'follow_index': 4,
+}
+# Списки админки: сессия, пользователь, оценка и число строк, строки, даты.
+ADMIN_QUERY_BUDGET = 6
+ADMIN_CHANGELISTS = (
+    'admin:posts_post_changelist',
+    'admin:posts_comment_changelist',
+    'admin:posts_follow_changelist',
+    'admin:auth_user_changelist',
+)
+ROWS = (10, 100, 1000)
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        cls.group = Group.objects.create(
+            title='Группа', slug='budget', description='Описание')
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def fill(self, rows):
+        """rows постов от rows // 10 авторов и rows комментариев к одному."""
+        authors = [
+            User.objects.create_user(username=f'author_{rows}_{number}')
+            for number in range(max(rows // 10, 1))
+        ]
+        for author in authors:
+            Follow.objects.create(user=self.reader, author=author)
+        Post.objects.bulk_create(
+            Post(author=authors[number % len(authors)], group=self.group,
+                 text=f'Пост {number}')
+            for number in range(rows)
+        )
+        timeline.rebuild([self.reader.pk])
+        post = Post.objects.filter(author=authors[0]).first()
+        Comment.objects.bulk_create(
+            Comment(post=post, author=authors[number % len(authors)],
+                    text=f'Комментарий {number}')
+            for number in range(rows)
+        )
+        return authors[0], post
+
+    def assertMaxQueries(self, budget, client, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(queries), budget,
+            '\n'.join(query['sql'] for query in queries.captured_queries))
+
+    def test_views_query_budget(self):
+        """Число запросов к базе не растёт вместе с объёмом данных."""
+        for rows in ROWS:
+            author, post = self.fill(rows)
+            pages = {
+                'index': (self.guest_client, reverse('posts:index')),
+                'group_list': (self.guest_client, reverse(
+                    'posts:group_list', kwargs={'slug': self.group.slug})),
+                'profile': (self.guest_client, reverse(
+                    'posts:profile', kwargs={'username': author.username})),
+                'post_detail': (self.guest_client, reverse(
+                    'posts:post_detail', kwargs={'post_id': post.pk})),
+                'follow_index': (
+                    self.authorized_client, reverse('posts:follow_index')),
+            }
+            for name, (client, url) in pages.items():
+                with self.subTest(rows=rows, view=name):
+                    self.assertMaxQueries(QUERY_BUDGETS[name], client, url)
+
+    def test_admin_changelists_query_budget(self):
+        """Списки админки не делают запросов на каждую строку."""
+        admin_client = Client()
+        admin_client.force_login(self.admin)
+        for rows in ROWS:
+            self.fill(rows)
+            for name in ADMIN_CHANGELISTS:
+                with self.subTest(rows=rows, changelist=name):
+                    self.assertMaxQueries(
+                        ADMIN_QUERY_BUDGET, admin_client, reverse(name))
+            today = timezone.localdate()
+            for drill in ({'pub_date__year': today.year},
+                          {'pub_date__year': today.year,
+                           'pub_date__month': today.month}):
+                with self.subTest(rows=rows, date_hierarchy=drill):
+                    self.assertMaxQueries(
+                        ADMIN_QUERY_BUDGET, admin_client,
+                        reverse('admin:posts_post_changelist') + '?'
+                        + urlencode(drill))
+
+
+class AdminCountTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        self.admin_client = Client()
+        self.admin_client.force_login(self.admin)
+
+    def test_admin_user_count_follows_signups(self):
+        """Число пользователей в админке учитывает новых и удалённых
+        сразу."""
+        url = reverse('admin:auth_user_changelist')
+        count = self.admin_client.get(url).context['cl'].result_count
+        newcomer = User.objects.create_user(username='newcomer')
+        self.assertEqual(
+            self.admin_client.get(url).context['cl'].result_count, count + 1)
+        newcomer.delete()
+        self.assertEqual(
+            self.admin_client.get(url).context['cl'].result_count, count)
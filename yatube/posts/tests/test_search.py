@@ -0,0 +1,74 @@
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import search
+from ..models import Post, PostTerm, User
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        cls.rare = Post.objects.create(
+            author=cls.user, text='Ёжик в тумане. Туман густой.')
+        cls.frequent = Post.objects.create(
+            author=cls.user, text='ежик ежик ежик и туман')
+        cls.other = Post.objects.create(author=cls.user, text='Про котов')
+
+    def test_tokenize(self):
+        """Слова приводятся к нижнему регистру, ё — к е, короткие отброшены."""
+        self.assertEqual(
+            search.tokenize('Ёжик, ЁЖИК и туман!'),
+            {'ежик': 2, 'туман': 1})
+
+    def test_search_ranks_posts_with_all_terms(self):
+        """Находятся посты со всеми словами, чаще встречающие — выше."""
+        self.assertEqual(
+            list(search.search('ежик туман')), [self.frequent, self.rare])
+        self.assertEqual(list(search.search('ежик котов')), [])
+        self.assertEqual(list(search.search('и')), [])
+
+    def test_index_follows_edit_and_delete(self):
+        """Правка поста переиндексирует его, удаление убирает из индекса."""
+        self.other.text = 'Про ежиков и ежик'
+        self.other.save()
+        self.assertIn(self.other, search.search('ежик'))
+        self.assertNotIn(self.other, search.search('котов'))
+        self.other.delete()
+        self.assertFalse(PostTerm.objects.filter(post=self.other.pk).exists())
+
+    def test_rebuild(self):
+        """Полная пересборка даёт тот же индекс."""
+        before = set(PostTerm.objects.values_list('term', 'post', 'weight'))
+        search.rebuild()
+        self.assertEqual(
+            set(PostTerm.objects.values_list('term', 'post', 'weight')),
+            before)
+
+    def test_search_page_walks_results(self):
+        """Страница поиска листается курсором и сохраняет запрос."""
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'поиск {number}')
+            for number in range(15))
+        search.rebuild()
+        client = Client()
+        response = client.get(reverse('posts:search'), {'q': 'Поиск'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 10)
+        self.assertContains(response, 'q=%D0%9F')
+        response = client.get(reverse('posts:search'), {
+            'q': 'Поиск', 'cursor': page_obj.next_cursor})
+        self.assertEqual(len(response.context['page_obj']), 5)
+        self.assertFalse(response.context['page_obj'].has_next())
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке находит посты через индекс."""
+        client = Client()
+        client.force_login(self.admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'туман'})
+        self.assertEqual(
+            set(response.context['cl'].result_list),
+            {self.rare, self.frequent})
@@ -1,11 +1,27 @@
+import threading
+import time
+from io import StringIO
+from importlib import import_module
+from types import SimpleNamespace
+from unittest import mock
+
 from django import forms
-from django.test import Client, TestCase, override_settings
+from django.apps import apps
+from django.db import connection, transaction
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings)
 from django.urls import reverse
-from yatube.settings import POSTS_PER_PAGE
-from ..models import Group, Post, User, Comment, Follow
+from yatube.settings import COMMENTS_PER_PAGE, POSTS_PER_PAGE
+from .. import recent_posts
+from ..feeds import follow_feed
+from ..models import Group, Post, User, Comment, Follow, TimelineEntry
+from users.models import Profile
 import tempfile
 import shutil
 from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.paginator import Paginator
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -47,6 +63,9 @@ class PostsViewsTests(TestCase):
         )
 
     def setUp(self):
+        # Число постов прошлых тестов иначе осталось бы в кеше: в
+        # TestCase версии зависимостей не растут.
+        cache.clear()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -183,3 +202,269 @@ class FollowTests(TestCase):
                                       kwargs={'username':
                                               self.user_following.username}))
         self.assertEqual(Follow.objects.all().count(), 0)
+
+    def test_timeline_follows_subscriptions(self):
+        """Лента подписок наполняется при подписке и новых постах."""
+        follow_url = reverse('posts:profile_follow',
+                             kwargs={'username': self.user_following.username})
+        unfollow_url = reverse('posts:profile_unfollow',
+                               kwargs={'username':
+                                       self.user_following.username})
+        self.client_auth_follower.get(follow_url)
+        new_post = Post.objects.create(
+            author=self.user_following,
+            text='Пост после подписки'
+        )
+        response = self.client_auth_follower.get(
+            reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.post])
+        self.client_auth_follower.get(unfollow_url)
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user_follower).exists())
+        response = self.client_auth_follower.get(
+            reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_rebuild_timelines(self):
+        """Команда rebuild_timelines восстанавливает ленты из подписок."""
+        Follow.objects.create(
+            user=self.user_follower, author=self.user_following)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user_follower, post=self.post).exists())
+
+    def test_migration_backfills_timelines(self):
+        """Миграция 0011 заполняет ленты новыми постами подписок."""
+        migration = import_module('posts.migrations.0011_backfill_timelines')
+        newer = Post.objects.create(
+            author=self.user_following, text='Новее')
+        Follow.objects.create(
+            user=self.user_follower, author=self.user_following)
+        Follow.objects.create(
+            user=self.user_following, author=self.user_follower)
+        TimelineEntry.objects.filter(post=self.post).delete()
+        schema_editor = SimpleNamespace(
+            connection=connection, quote_name=connection.ops.quote_name)
+        with mock.patch.object(migration, 'ENTRIES_PER_READER', 1):
+            migration.backfill_timelines(apps, schema_editor)
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(
+                user=self.user_follower).values_list('post', flat=True)),
+            [newer.pk])
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user_following).exists())
+
+
+class RecentPostsTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user_follower = User.objects.create_user(username='follower')
+        self.user_following = User.objects.create_user(username='following')
+        self.post = Post.objects.create(
+            author=self.user_following,
+            text='Тестовая запись для тестирования ленты'
+        )
+        self.key = recent_posts.buffer_key(self.user_following.pk)
+
+    def buffer(self):
+        return cache.get(self.key)[0]
+
+    def test_merge_engine_matches_join(self):
+        """Движок 'merge' отдаёт те же посты, что и соединение."""
+        another_author = User.objects.create_user(username='another')
+        Follow.objects.create(
+            user=self.user_follower, author=self.user_following)
+        Follow.objects.create(user=self.user_follower, author=another_author)
+        for number in range(POSTS_PER_PAGE):
+            Post.objects.create(author=another_author, text=f'Пост {number}')
+            Post.objects.create(
+                author=self.user_following, text=f'Запись {number}')
+        for deleted in (None, self.post):
+            if deleted is not None:
+                deleted.delete()
+            with self.subTest(deleted=deleted):
+                expected = list(follow_feed(self.user_follower, 'join'))
+                paginator = Paginator(
+                    follow_feed(self.user_follower, 'merge'), POSTS_PER_PAGE)
+                self.assertEqual(paginator.count, len(expected))
+                merged = []
+                for number in paginator.page_range:
+                    merged += list(paginator.page(number))
+                self.assertEqual(merged, expected)
+
+    def test_buffer_changed_after_commit(self):
+        """Буфер меняется только после фиксации транзакции."""
+        recent_posts.get_buffers([self.user_following.pk])
+        with transaction.atomic():
+            post = Post.objects.create(
+                author=self.user_following, text='В транзакции')
+            self.assertNotIn(post.pk, [pk for _, pk in self.buffer()])
+        self.assertEqual(self.buffer()[0][1], post.pk)
+        post.delete()
+        self.assertNotIn(post.pk, [pk for _, pk in self.buffer()])
+
+    def test_concurrent_updates_kept(self):
+        """Одновременные изменения буфера не затирают друг друга."""
+        recent_posts.get_buffers([self.user_following.pk])
+        updates = 8
+        barrier = threading.Barrier(updates)
+
+        def update(number):
+            def change(entries, exhausted):
+                time.sleep(0.01)
+                return entries + [(0, -number)], exhausted
+            barrier.wait()
+            recent_posts._update(self.key, change)
+        threads = [
+            threading.Thread(target=update, args=(number,))
+            for number in range(1, updates + 1)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(
+            sorted(pk for _, pk in self.buffer() if pk < 0),
+            list(range(-updates, 0)))
+
+    def test_buffer_dropped_when_lock_held(self):
+        """Если блокировку не отпускают, буфер перечитывается из базы."""
+        recent_posts.get_buffers([self.user_following.pk])
+        cache.add(f'{self.key}:lock', 'другой процесс', 30)
+        with mock.patch('posts.recent_posts.STAMPEDE_WAIT', 0):
+            Post.objects.create(author=self.user_following, text='Новый')
+        self.assertIsNone(cache.get(self.key))
+
+
+class CountersTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='counter')
+        self.author = User.objects.create_user(username='author')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_counters_follow_views(self):
+        """Счётчики меняются вместе с постами, комментариями и подписками."""
+        self.client.post(reverse('posts:post_create'), {'text': 'Пост'})
+        post = Post.objects.get(author=self.user)
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            {'text': 'Комментарий'})
+        self.client.get(reverse('posts:profile_follow',
+                                kwargs={'username': self.author.username}))
+        post.refresh_from_db()
+        self.user.profile.refresh_from_db()
+        self.author.profile.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.user.profile.posts_count, 1)
+        self.assertEqual(self.user.profile.following_count, 1)
+        self.assertEqual(self.author.profile.followers_count, 1)
+        self.client.get(reverse('posts:profile_unfollow',
+                                kwargs={'username': self.author.username}))
+        self.client.post(reverse('posts:post_del',
+                                 kwargs={'post_id': post.pk}))
+        self.user.profile.refresh_from_db()
+        self.author.profile.refresh_from_db()
+        self.assertEqual(self.user.profile.posts_count, 0)
+        self.assertEqual(self.author.profile.followers_count, 0)
+
+    def test_counters_follow_orm_writes(self):
+        """Записи мимо views учитываются, сохранение профиля их не
+        затирает, а удаление не уводит счётчики ниже нуля."""
+        profile = Profile.objects.get(user=self.user)
+        post = Post.objects.create(author=self.user, text='Из shell')
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Из shell')
+        profile.save()
+        profile.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(profile.posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
+        # Счётчики разошлись, например после правки в обход ORM.
+        Profile.objects.filter(user=self.user).update(posts_count=0)
+        Post.objects.filter(pk=post.pk).update(comments_count=0)
+        for url in (
+            reverse('posts:del_comment', kwargs={'comment_id': comment.pk}),
+            reverse('posts:post_del', kwargs={'post_id': post.pk}),
+        ):
+            self.assertEqual(self.client.post(url).status_code, 302)
+        profile.refresh_from_db()
+        self.assertEqual(profile.posts_count, 0)
+        self.assertFalse(Post.objects.filter(pk=post.pk).exists())
+
+    def test_reconcile_counters(self):
+        """reconcile_counters исправляет разошедшиеся счётчики."""
+        Post.objects.bulk_create(
+            [Post(author=self.author, text='Текст') for _ in range(3)])
+        call_command('reconcile_counters', stdout=StringIO())
+        self.author.profile.refresh_from_db()
+        self.assertEqual(self.author.profile.posts_count, 3)
+
+
+class FeedCacheTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='cached')
+        for number in range(POSTS_PER_PAGE + 1):
+            Post.objects.create(author=self.user, text=f'Пост номер {number}')
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_pages_cached_separately(self):
+        """Страницы ленты кешируются под разными ключами."""
+        first = self.guest_client.get(reverse('posts:index')).content
+        second = self.guest_client.get(
+            reverse('posts:index') + '?page=2').content
+        self.assertIn('Пост номер 0'.encode(), second)
+        self.assertNotIn('Пост номер 0'.encode(), first)
+
+    def test_new_post_visible_immediately(self):
+        """Запись поста сразу делает кеш ленты устаревшим."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': 'cached'}),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        Post.objects.create(author=self.user, text='Свежий пост')
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertContains(response, 'Свежий пост')
+
+
+class CommentsPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='commenter')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {n}')
+            for n in range(COMMENTS_PER_PAGE * 2 + 5))
+
+    def test_comments_loaded_in_batches(self):
+        """Сразу видна первая порция, остальные отдаёт фрагмент."""
+        client = Client()
+        response = client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertContains(response, 'js-more-comments')
+        seen = [comment.pk for comment in comments]
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+        while comments.has_next():
+            with self.assertNumQueries(1):
+                response = client.get(url, {'cursor': comments.next_cursor})
+            comments = response.context['comments']
+            seen.extend(comment.pk for comment in comments)
+        self.assertEqual(len(comments), 5)
+        self.assertNotContains(response, 'js-more-comments')
+        self.assertEqual(seen, list(
+            self.post.comments.order_by('created', 'pk').values_list(
+                'pk', flat=True)))
+
+    def test_missing_post_comments_not_found(self):
+        """Фрагмент комментариев несуществующего поста — 404."""
+        response = Client().get(
+            reverse('posts:post_comments', kwargs={'post_id': 0}))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,73 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Каждый новый пост раскладывается в таблицу TimelineEntry всем
+подписчикам автора, поэтому лента подписок читается одним
+диапазоном по индексу (user, -pub_date) без соединения с Follow.
+"""
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .models import Follow, Post, TimelineEntry
+
+FAN_OUT_BATCH_SIZE = 1000
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    batch = []
+    for user_id in followers.iterator():
+        batch.append(TimelineEntry(
+            user_id=user_id, post_id=post.pk, pub_date=post.pub_date))
+        if len(batch) >= FAN_OUT_BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch)
+
+
+@transaction.atomic
+def backfill(user_id, author_id):
+    """Заполняет ленту читателя постами автора после подписки."""
+    drop_author(user_id, author_id)
+    _insert_from_follows('f.user_id = %s AND f.author_id = %s',
+                         [user_id, author_id])
+
+
+def drop_author(user_id, author_id):
+    """Убирает из ленты читателя посты автора после отписки."""
+    post_ids = Post.objects.filter(
+        author_id=author_id).values_list('pk', flat=True)
+    TimelineEntry.objects.filter(
+        user_id=user_id, post_id__in=post_ids).delete()
+
+
+def rebuild(user_ids=None, using=DEFAULT_DB_ALIAS):
+    """Пересобирает ленты указанных пользователей (или всех)."""
+    with transaction.atomic(using=using):
+        entries = TimelineEntry.objects.using(using)
+        if user_ids is None:
+            entries.delete()
+            _insert_from_follows('1 = 1', [], using)
+            return
+        user_ids = list(user_ids)
+        entries.filter(user_id__in=user_ids).delete()
+        if user_ids:
+            placeholders = ', '.join(['%s'] * len(user_ids))
+            _insert_from_follows(
+                f'f.user_id IN ({placeholders})', user_ids, using)
+
+
+def _insert_from_follows(where, params, using=DEFAULT_DB_ALIAS):
+    """INSERT ... SELECT по подпискам: без выгрузки строк в Python."""
+    sql = (
+        f'INSERT INTO {TimelineEntry._meta.db_table} '
+        '(user_id, post_id, pub_date) '
+        'SELECT f.user_id, p.id, p.pub_date '
+        f'FROM {Follow._meta.db_table} f '
+        f'JOIN {Post._meta.db_table} p ON p.author_id = f.author_id '
+        f'WHERE {where}'
+    )
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params)
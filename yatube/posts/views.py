@@ -1,64 +1,151 @@
+from urllib.parse import urlencode
+
+from django.http import Http404
 from django.shortcuts import render, redirect, get_object_or_404
 from .models import Post, Group, User, Follow, Comment
 from .forms import PostForm, CommentForm
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.core.paginator import Paginator
-from yatube.settings import POSTS_PER_PAGE
+from django.db.models import QuerySet
+from core.dependencies import depend
+from yatube.settings import (
+    COMMENTS_PER_PAGE, POSTS_PER_PAGE, POSTS_PAGINATION)
+from . import feed_cache
+from . import search as post_search
+from .conditional import conditional_page
+from .feeds import follow_feed
+from .pagination import CachedCountPaginator, CursorPaginator
+
+
+def paginator(request, posts, *dependencies):
+    """Вспомогательная функция для паджинатора.
 
+    dependencies — зависимости ленты, по которым кешируется число постов.
 
-def paginator(page_number, posts):
-    """Вспомогательная функция для паджинатора."""
-    paginator = Paginator(posts, POSTS_PER_PAGE)
-    page_obj = paginator.get_page(page_number)
+    Параметр ?cursor= включает паджинацию по ключу (pub_date, id);
+    при POSTS_PAGINATION = 'cursor' она используется и по умолчанию,
+    если в запросе нет явного ?page=. Ленты, которые не являются
+    QuerySet (движок 'merge'), всегда листаются по номерам страниц.
+    """
+    if isinstance(posts, QuerySet) and ('cursor' in request.GET or (
+        POSTS_PAGINATION == 'cursor' and 'page' not in request.GET
+    )):
+        paginator = CursorPaginator(posts, POSTS_PER_PAGE)
+        return paginator.get_page(request.GET.get('cursor'))
+    if isinstance(posts, QuerySet):
+        paginator = CachedCountPaginator(
+            posts, POSTS_PER_PAGE, dependencies=dependencies)
+    else:
+        paginator = Paginator(posts, POSTS_PER_PAGE)
+    page_obj = paginator.get_page(request.GET.get('page'))
     return page_obj
 
 
+@conditional_page('posts', 'groups')
 def index(request):
     """Главная страница."""
     template = 'posts/index.html'
-    posts = Post.objects.all()
+    posts = Post.objects.select_related('author', 'group')
     context = {
-        'page_obj': paginator(request.GET.get('page'), posts),
+        'page_obj': paginator(request, posts, 'posts'),
+        **feed_cache.context(request, 'posts', 'groups', 'authors'),
     }
     return render(request, template, context)
 
 
+@conditional_page('posts', 'groups')
 def group_posts(request, slug):
     """Страница постов группы."""
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    posts = Post.objects.filter(group=group)
+    posts = Post.objects.filter(group=group).select_related('author', 'group')
     context = {
         'group': group,
         'posts': posts,
-        'page_obj': paginator(request.GET.get('page'), posts),
+        'page_obj': paginator(request, posts, f'posts:group:{group.pk}'),
+        **feed_cache.context(
+            request, f'posts:group:{group.pk}', f'group:{group.pk}',
+            'authors'),
     }
     return render(request, template, context)
 
 
+@conditional_page('posts', 'groups', 'follows')
 def profile(request, username):
     """Страница пользователя."""
     author = get_object_or_404(
         User.objects.select_related('profile'), username=username)
-    posts = author.posts.all()
+    posts = author.posts.select_related('author', 'group')
     template = 'posts/profile.html'
     context = {
         'author': author,
         'posts': posts,
-        'page_obj': paginator(request.GET.get('page'), posts),
+        'page_obj': paginator(request, posts, f'posts:author:{author.pk}'),
+        **feed_cache.context(
+            request, f'posts:author:{author.pk}', f'profile:{author.pk}',
+            'groups', 'authors'),
+    }
+    return render(request, template, context)
+
+
+def search(request):
+    """Поиск по тексту постов."""
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        posts = post_search.search(
+            query, Post.objects.select_related('author', 'group'))
+        page_obj = CursorPaginator(posts, POSTS_PER_PAGE).get_page(
+            request.GET.get('cursor'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'paginator_query': urlencode({'q': query}),
     }
     return render(request, template, context)
 
 
+@conditional_page('posts', 'groups', 'comments:post:{post_id}')
 def post_detail(request, post_id):
     """Информация о посте."""
     form = CommentForm(request.POST or None)
-    page_obj = get_object_or_404(Post, id=post_id)
-    comments = page_obj.comments.all()
+    page_obj = get_object_or_404(
+        Post.objects.select_related('author__profile', 'group'), id=post_id)
+    # Кроме поста, на странице видны группа и число постов автора.
+    depend(
+        request, f'post:{page_obj.pk}', f'comments:post:{page_obj.pk}',
+        f'profile:{page_obj.author_id}', f'group:{page_obj.group_id}',
+        'authors')
     template = 'posts/post_detail.html'
     context = {
         'page_obj': page_obj,
         'form': form,
+        'post_id': page_obj.pk,
+        'comments': comments_page(page_obj.pk),
+    }
+    return render(request, template, context)
+
+
+def comments_page(post_id, cursor=None):
+    """Порция комментариев поста по ключу (created, id) с авторами."""
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author').order_by('created', 'pk')
+    paginator = CursorPaginator(comments, COMMENTS_PER_PAGE)
+    return paginator.get_page(cursor)
+
+
+def post_comments(request, post_id):
+    """Фрагмент со следующей порцией комментариев."""
+    template = 'posts/includes/comments.html'
+    comments = comments_page(post_id, request.GET.get('cursor'))
+    # Пост проверяется, только если комментариев нет: у непустой
+    # порции он точно есть.
+    if not comments and not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    context = {
+        'post_id': post_id,
         'comments': comments,
     }
     return render(request, template, context)
@@ -107,7 +194,7 @@ def post_edit(request, post_id):
 def post_del(request, post_id):
     """Удаление поста."""
     post = get_object_or_404(Post, pk=post_id)
-    if request.user.pk != post.author.pk:
+    if request.user.pk != post.author_id:
         return redirect('posts:index')
     post.delete()
     return redirect('posts:index')
@@ -122,7 +209,8 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect("posts:post_detail", post_id=post_id)
 
 
@@ -154,18 +242,21 @@ def del_comment(request, comment_id):
     """Удаление коммента."""
     comment = get_object_or_404(Comment, pk=comment_id)
     if request.user.pk != comment.author.pk:
-        return redirect('posts:post_detail', comment.post.pk)
+        return redirect('posts:post_detail', comment.post_id)
     comment.delete()
-    return redirect('posts:post_detail', comment.post.pk)
+    return redirect('posts:post_detail', comment.post_id)
 
 
 @login_required
 def follow_index(request):
     """Подписки пользователя."""
     template = 'posts/follow.html'
-    posts = Post.objects.filter(author__following__user=request.user)
+    posts = follow_feed(
+        request.user, queryset=Post.objects.select_related('author', 'group'))
+    # Состав ленты меняют посты авторов и подписки читателя.
     context = {
-        'page_obj': paginator(request.GET.get('page'), posts),
+        'page_obj': paginator(
+            request, posts, 'posts', f'profile:{request.user.pk}'),
         'title': 'Подписки'
     }
     return render(request, template, context)
@@ -178,7 +269,8 @@ def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     is_follower = Follow.objects.filter(user=user, author=author)
     if user != author and not is_follower.exists():
-        Follow.objects.create(user=user, author=author)
+        with transaction.atomic():
+            Follow.objects.create(user=user, author=author)
     return redirect('posts:profile', username=author)
 
 
@@ -186,6 +278,5 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     """Отписка от автора."""
     author = get_object_or_404(User, username=username)
-    is_follower = Follow.objects.filter(user=request.user, author=author)
-    is_follower.delete()
+    Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username=author)
@@ -2,16 +2,21 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import User
 
+from posts.admin import LargeTableAdmin
 from .models import Profile
 
 
-class rofileInline(admin.StackedInline):
+class ProfileInline(admin.StackedInline):
     model = Profile
     can_delete = False
+    readonly_fields = ('posts_count', 'followers_count', 'following_count')
 
 
-class UserAdmin(BaseUserAdmin):
-    inlines = (rofileInline,)
+class UserAdmin(BaseUserAdmin, LargeTableAdmin):
+    # Поколение 'users' повышают регистрация и удаление пользователя
+    # (posts.feed_cache.user_dependencies).
+    inlines = (ProfileInline,)
+    count_dependencies = ('users',)
 
 
 admin.site.unregister(User)
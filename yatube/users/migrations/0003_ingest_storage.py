@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:23
+
+import core.images
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_profile_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='profile_pic',
+            field=models.ImageField(blank=True, null=True, storage=core.images.IngestStorage(), upload_to='profile_pic/', validators=[core.images.validate_upload]),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:26
+
+import core.images
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_ingest_storage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='profile_pic',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.DedupStorage(), upload_to='profile_pic/', validators=[core.images.validate_upload]),
+        ),
+    ]
@@ -1,15 +1,29 @@
+from core.images import validate_upload
+from core.storage import media_storage
 from posts.models import User
 from django.db import models
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
 
+COUNTERS = ('posts_count', 'followers_count', 'following_count')
+
+
 class Profile(models.Model):
     """Расширение модели пользователя."""
     user = models.OneToOneField(User, null=True, on_delete=models.CASCADE)
     bio = models.TextField(max_length=500, blank=True)
     profile_pic = models.ImageField(
-        null=True, blank=True, upload_to="profile_pic/",)
+        null=True, blank=True, upload_to="profile_pic/",
+        storage=media_storage, validators=[validate_upload])
+    # Денормализованные счётчики: ведутся posts.counters,
+    # расхождения правит manage.py reconcile_counters.
+    posts_count = models.PositiveIntegerField(
+        'Число постов', default=0, editable=False)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков', default=0, editable=False)
+    following_count = models.PositiveIntegerField(
+        'Число подписок', default=0, editable=False)
 
     @receiver(post_save, sender=User)
     def create_user_profile(sender, instance, created, **kwargs):
@@ -21,5 +35,15 @@ class Profile(models.Model):
     def save_user_profile(sender, instance, **kwargs):
         instance.profile.save()
 
+    def save(self, *args, **kwargs):
+        """Счётчики не перезаписываются значениями, прочитанными раньше:
+        их меняет только posts.counters."""
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COUNTERS
+            ]
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return str(self.user)
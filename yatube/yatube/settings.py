@@ -1,4 +1,5 @@
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -40,6 +41,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.StaticFilesMiddleware',
+    'core.pagecache.PageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -78,7 +81,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+    },
+    # Отдельная база для manage.py bench_indexes: замеры удаляют индексы
+    # и заполняют таблицы синтетическими данными.
+    'bench': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'bench.sqlite3'),
+    },
 }
 
 
@@ -120,6 +129,11 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
+# collectstatic добавляет в имена хеш содержимого и сжимает текстовые
+# файлы в .gz и .br (если установлен brotli); отдаёт их с долгим
+# кешированием core.middleware.StaticFilesMiddleware.
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+STATICFILES_STORAGE = 'core.staticfiles.CompressedManifestStaticFilesStorage'
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -130,11 +144,82 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 POSTS_PER_PAGE = 10
 
+# Комментарии под постом: столько показывается сразу, остальные
+# догружаются такими же порциями с /posts/<id>/comments/?cursor=.
+COMMENTS_PER_PAGE = 20
+
+# 'page' — номера страниц (COUNT(*) + OFFSET),
+# 'cursor' — паджинация по ключу (pub_date, id), одинаково быстрая на любой глубине.
+POSTS_PAGINATION = 'page'
+
+# Источник ленты подписок: 'timeline' — материализованная лента
+# (fan-out on write), 'join' — соединение Follow и Post на каждый запрос,
+# 'merge' — слияние кешированных буферов последних постов авторов.
+# Ленты 'timeline' по существующим подпискам заполняет миграция 0011,
+# дальше их ведут сигналы — только при этом движке: после переключения
+# на него с другого выполните manage.py rebuild_timelines.
+FOLLOW_FEED_ENGINE = 'timeline'
+
+# Длина буфера последних постов автора для движка 'merge' и срок, после
+# которого буфер перечитывается из базы.
+FOLLOW_FEED_BUFFER_SIZE = 200
+FOLLOW_FEED_BUFFER_TIMEOUT = 60 * 60 * 24
+
+# Число постов для паджинатора кешируется до записи в ленты или TTL;
+# таблица без фильтров больше порога считается по оценке СУБД.
+PAGINATOR_COUNT_TIMEOUT = 60 * 10
+PAGINATOR_ESTIMATE_THRESHOLD = 100_000
+
+# Время жизни фрагментов лент: свежесть обеспечивают поколения их
+# зависимостей (core.dependencies), которые повышает запись в базу.
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Страницы лент и постов целиком кешируются для гостей (core.pagecache)
+# и сбрасываются по зависимостям при записи. В тестах кеш страниц выключен:
+# они проверяют контекст шаблона, которого нет у ответа из кеша.
+# YATUBE_TESTING задают настройки yatube.test_settings.
+TESTING = os.environ.get('YATUBE_TESTING') == '1'
+PAGE_CACHE_TIMEOUT = 0 if TESTING else 60 * 60 * 24
+
+# Устаревший фрагмент или страницу пересчитывает один запрос под
+# блокировкой (core.stampede), остальные отдают прошлую копию, если она
+# моложе срока + STAMPEDE_STALE_TIMEOUT, или ждут до STAMPEDE_WAIT с.
+# STAMPEDE_BETA > 1 обновляет записи раньше срока чаще.
+STAMPEDE_LOCK_TIMEOUT = 30
+STAMPEDE_STALE_TIMEOUT = 60 * 5
+STAMPEDE_WAIT = 5
+STAMPEDE_BETA = 1.0
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# Кеш общий для всех воркеров хоста (core.cache.SQLiteCache): версии
+# лент и тегов страниц, повышенные в одном воркере, видны остальным.
+# Перед ним LRU воркера (core.cache.TieredCache): чужие записи доходят
+# до него не позже чем через CHECK_INTERVAL секунд; если процесс отстал
+# больше чем на CHANGE_LOG_SIZE записей, его LRU очищается целиком.
+# Тесты пишут в отдельный файл и не сбрасывают кеш запущенного сайта.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'MAX_SIZE': 32 * 1024 * 1024,
+            'CHECK_INTERVAL': 1,
+            'LOCAL_TIMEOUT': 60,
+            'CHANGE_LOG_SIZE': 100,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        # Тестам — свой файл во временном каталоге, вне дерева проекта.
+        'LOCATION': os.path.join(
+            tempfile.gettempdir(), 'yatube_test_cache.sqlite3',
+        ) if TESTING else os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            # Буферы последних постов ('merge') — по ключу на автора.
+            'MAX_ENTRIES': 100_000,
+            'MAX_SIZE': 256 * 1024 * 1024,
+        },
     }
 }
 
@@ -143,3 +228,43 @@ CACHES = {
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Загрузки сразу пишутся во временный файл, а не копятся в памяти.
+# Потолок размера картинки проверяет core.images.validate_upload, тело
+# запроса целиком ограничивает фронтовый сервер (client_max_body_size).
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+IMAGE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+# Картинки постов и аватары пережимаются при загрузке (core.images):
+# не больше IMAGE_MAX_DIMENSIONS, без EXIF, плюс WebP-варианты.
+IMAGE_MAX_DIMENSIONS = (2560, 2560)
+IMAGE_JPEG_QUALITY = 85
+IMAGE_WEBP_QUALITY = 80
+IMAGE_WEBP_WIDTHS = (480, 960)
+
+# Миниатюры: все варианты создаются фоновыми потоками после сохранения
+# картинки (core.thumbnails), шаблоны только ищут готовые и до их
+# появления показывают заглушку. Недостающие варианты старых постов
+# создаёт manage.py warm_thumbnails.
+THUMBNAIL_BACKEND = 'core.thumbnails.ThumbnailBackend'
+# Движок уменьшает JPEG при декодировании (draft) и остальные форматы
+# перед ресемплингом (reduce); больше THUMBNAIL_MAX_PIXELS не декодирует.
+THUMBNAIL_ENGINE = 'core.thumbnail_engine.Engine'
+THUMBNAIL_MAX_PIXELS = 24_000_000
+THUMBNAIL_VARIANTS = {
+    'post_feed': ('500x400', {'crop': 'center', 'upscale': True}),
+    'post_detail': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+# 0 — миниатюры создаются сразу после фиксации, без потоков: в тестах
+# потоки делили бы с ними базу в памяти.
+THUMBNAIL_WORKERS = 0 if TESTING else 2
+# Ширины каждого варианта для srcset (базовая из THUMBNAIL_VARIANTS
+# добавляется сама) и sizes под раскладку: карточка ленты — col-md-3,
+# картинка поста — col-md-9.
+THUMBNAIL_SRCSET = {
+    'post_feed': ((250, 1000), '(min-width: 768px) 25vw, 100vw'),
+    'post_detail': ((480, 1440), '(min-width: 768px) 75vw, 100vw'),
+}
+# Ширина заглушки, которая встраивается в страницу до загрузки картинки.
+THUMBNAIL_PLACEHOLDER_WIDTH = 16
@@ -0,0 +1,10 @@
+"""Настройки тестов: manage.py test и pytest (pytest.ini).
+
+Модули проекта читают настройки прямо из yatube.settings, поэтому
+тестовый режим включается переменной окружения до их загрузки.
+"""
+import os
+
+os.environ['YATUBE_TESTING'] = '1'
+
+from .settings import *  # noqa: E402,F401,F403